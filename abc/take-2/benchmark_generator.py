@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Synthetic Case Note Generator - Benchmark Suite
+
+Times every stage of generate_synthetic_data.py (demographics, scenarios,
+notes, metadata, each export format) and the end-to-end main() path across
+population sizes. Both generation paths are covered: the columnar batch
+stages at every size, and the per-client scalar stages and a main() run
+without --batch (the default CLI path) at sizes up to --scalar-max-size. Each run is appended as JSON Lines to a history file, and
+can be compared against a saved baseline to flag regressions.
+
+Stages are timed in untraced passes, repeated --repeats times and keeping
+the fastest run of each stage (best-of-N damps scheduler and cache noise);
+peak memory comes from one more pass under tracemalloc, whose overhead
+would otherwise distort the timings (allocations made by pyarrow's own
+memory pool are not traced). The main() run reports the peak RSS of its
+process instead, from `resource` on POSIX or psutil (e.g. on Windows), or
+the tracemalloc peak when neither is available.
+
+Example:
+    python benchmark_generator.py --sizes 1e3,1e4,1e5 --save-baseline benchmarks/baseline.json
+    python benchmark_generator.py --sizes 1e3,1e4,1e5 --baseline benchmarks/baseline.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+import generate_synthetic_data
+from generate_synthetic_data import STREAM_FORMATS, DatasetMetrics, SyntheticCaseNoteGenerator
+
+# Peak RSS of the main() process: resource on POSIX, psutil elsewhere (e.g. Windows)
+try:
+    import resource
+except ImportError:
+    resource = None
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+EXPORT_FORMATS = ("csv", "json", "jsonl", "parquet", "feather")
+
+# Largest size the per-client scalar path is timed at by default
+SCALAR_MAX_SIZE = 100_000
+
+# The data file each export stage writes (its output_bytes)
+EXPORT_FILES = {**STREAM_FORMATS, "json": "synthetic-case-notes.json"}
+
+
+def run_stage(func: Callable, track_memory: bool = True) -> Tuple[object, float, int]:
+    """Run func() and return (result, wall seconds, tracemalloc peak bytes or 0)."""
+    if track_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func()
+    seconds = time.perf_counter() - start
+    peak = 0
+    if track_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, seconds, peak
+
+
+def process_peak_bytes() -> Tuple[int, str]:
+    """Peak memory of this process (and its finished children) in bytes, with the source it came from."""
+    if resource is not None:
+        max_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                      resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+        # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+        return max_rss * (1 if sys.platform == "darwin" else 1024), "ru_maxrss"
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss), "psutil"
+    return tracemalloc.get_traced_memory()[1], "tracemalloc"
+
+
+def run_main_child(argv: List[str]):
+    """Run generate_synthetic_data.main(argv) in this (fresh) process and print its peak memory as JSON."""
+    if resource is None and psutil is None:
+        tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        generate_synthetic_data.main(argv)
+    peak_bytes, source = process_peak_bytes()
+    print(json.dumps({"peak_bytes": peak_bytes, "peak_source": source}))
+
+
+def best_of(runs: List[List[Dict]]) -> List[Dict]:
+    """Per stage, the record of the fastest of several repeated runs."""
+    best = []
+    for repeats in zip(*runs):
+        fastest = min(repeats, key=lambda record: record["seconds"])
+        best.append({**fastest, "repeats": len(repeats)})
+    return best
+
+
+def directory_bytes(path: str) -> int:
+    """Total size of the files directly inside path."""
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+def benchmark_stages(size: int, seed: int, formats: Tuple[str, ...], track_memory: bool,
+                     scalar: bool = False) -> List[Dict]:
+    """Time each generator stage for one population size; `scalar` adds the per-client path's stages."""
+    generator = SyntheticCaseNoteGenerator(seed=seed)
+    rng = np.random.default_rng(seed)
+    records = []
+
+    def record(stage: str, seconds: float, peak: int, output_bytes: int = None):
+        records.append({
+            "size": size,
+            "stage": stage,
+            "seconds": round(seconds, 6),
+            "rows_per_second": round(size / seconds, 1) if seconds else None,
+            "peak_bytes": peak,
+            "output_bytes": output_bytes
+        })
+
+    if scalar:
+        scalar_generator = SyntheticCaseNoteGenerator(seed=seed)
+        people, seconds, peak = run_stage(lambda: scalar_generator.generate_demographics(size), track_memory)
+        record("scalar_demographics", seconds, peak)
+        people, seconds, peak = run_stage(lambda: scalar_generator.generate_embedded_scenarios(people), track_memory)
+        record("scalar_scenarios", seconds, peak)
+        _, seconds, peak = run_stage(
+            lambda: [scalar_generator.generate_case_note(person) for person in people], track_memory
+        )
+        record("scalar_notes", seconds, peak)
+
+    clients, seconds, peak = run_stage(lambda: generator.generate_demographics_batch(size, rng=rng), track_memory)
+    record("demographics", seconds, peak)
+
+    clients, seconds, peak = run_stage(lambda: generator.generate_embedded_scenarios(clients, rng=rng), track_memory)
+    record("scenarios", seconds, peak)
+
+    notes, seconds, peak = run_stage(lambda: generator.generate_case_notes_batch(clients, rng=rng), track_memory)
+    clients["case_note"] = notes
+    record("notes", seconds, peak)
+
+    def build_metadata():
+        metrics = DatasetMetrics.from_frame(clients, list(generator.scenario_rates), list(generator.risk_factors))
+        return generator._build_metadata(metrics)
+
+    metadata, seconds, peak = run_stage(build_metadata, track_memory)
+    record("metadata", seconds, peak)
+
+    writers = {
+        "csv": lambda out: generator._write_csv(generator._prepare_export_frame(clients), out),
+        "json": lambda out: generator._write_json(generator._prepare_export_frame(clients), metadata, out),
+        "jsonl": lambda out: generator._write_json_lines(generator._prepare_export_frame(clients), out),
+        "parquet": lambda out: generator.export_columnar(clients, metadata, out, formats=("parquet",)),
+        "feather": lambda out: generator.export_columnar(clients, metadata, out, formats=("feather",))
+    }
+    for fmt in formats:
+        with tempfile.TemporaryDirectory() as output_dir:
+            _, seconds, peak = run_stage(lambda: writers[fmt](output_dir), track_memory)
+            record(f"export_{fmt}", seconds, peak, os.path.getsize(os.path.join(output_dir, EXPORT_FILES[fmt])))
+
+    return records
+
+
+def benchmark_main(size: int, seed: int, workers: int, batch: bool = True) -> Dict:
+    """Time the end-to-end main() path in a fresh process and record its peak memory (see run_main_child).
+
+    With `batch=False` main() runs without --batch, on the scalar path the
+    default CLI uses (single process, so `workers` is ignored).
+    """
+    with tempfile.TemporaryDirectory() as output_dir:
+        main_args = ["--count", str(size), "--seed", str(seed), "--output-dir", output_dir, "--no-cache"]
+        if batch:
+            main_args += ["--batch", "--workers", str(workers)]
+        command = [
+            sys.executable, "-c", "import sys, benchmark_generator; benchmark_generator.run_main_child(sys.argv[1:])",
+            *main_args
+        ]
+        start = time.perf_counter()
+        process = subprocess.run(command, stdout=subprocess.PIPE, text=True, cwd=SCRIPT_DIR)
+        seconds = time.perf_counter() - start
+        if process.returncode != 0:
+            raise RuntimeError(f"main() failed for size {size} (exit code {process.returncode})")
+        peak = json.loads(process.stdout.strip().splitlines()[-1])
+        return {
+            "size": size,
+            "stage": "main_batch" if batch else "main_scalar",
+            "seconds": round(seconds, 6),
+            "rows_per_second": round(size / seconds, 1),
+            "peak_bytes": peak["peak_bytes"],
+            "peak_source": peak["peak_source"],
+            "output_bytes": directory_bytes(output_dir)
+        }
+
+
+def environment_info() -> Dict:
+    """Versions and commit recorded alongside each run."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count()
+    }
+
+
+def find_regressions(results: List[Dict], baseline: List[Dict], tolerance: float) -> List[str]:
+    """Compare seconds and peak memory per (size, stage) against a baseline."""
+    reference = {(r["size"], r["stage"]): r for r in baseline}
+    regressions = []
+    for result in results:
+        base = reference.get((result["size"], result["stage"]))
+        if base is None:
+            continue
+        for metric in ("seconds", "peak_bytes"):
+            if base.get(metric) and result.get(metric) and result[metric] > base[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{result['stage']} @ {result['size']:,}: {metric} {result[metric]:,} vs baseline {base[metric]:,} "
+                    f"(+{(result[metric] / base[metric] - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def print_results(results: List[Dict]):
+    """Print a results table."""
+    print(f"{'size':>12} {'stage':<20} {'seconds':>10} {'rows/s':>14} {'peak MB':>10} {'output MB':>10}")
+    for r in results:
+        output_mb = f"{r['output_bytes'] / 1e6:.1f}" if r["output_bytes"] is not None else ""
+        rate = f"{r['rows_per_second']:,.0f}" if r["rows_per_second"] else ""
+        print(f"{r['size']:>12,} {r['stage']:<20} {r['seconds']:>10.3f} {rate:>14} "
+              f"{r['peak_bytes'] / 1e6:>10.1f} {output_mb:>10}")
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    """Parse command-line options."""
+    parser = argparse.ArgumentParser(description="Benchmark synthetic case note generation stages.")
+    parser.add_argument("--sizes", default="1e3,1e4,1e5,1e6,1e7",
+                        help="comma-separated population sizes (scientific notation allowed)")
+    parser.add_argument("--seed", type=int, default=42, help="master random seed")
+    parser.add_argument("--formats", default=",".join(EXPORT_FORMATS),
+                        help="comma-separated export formats to time")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes for the end-to-end main() run")
+    parser.add_argument("--repeats", type=int, default=3,
+                        help="timed runs per stage; the fastest is kept (best-of-N)")
+    parser.add_argument("--scalar-max-size", type=float, default=SCALAR_MAX_SIZE,
+                        help="largest size the scalar (non --batch) stages and main() run are timed at")
+    parser.add_argument("--skip-main", action="store_true", help="skip the end-to-end main() runs")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass (peak_bytes is then 0 for stages)")
+    parser.add_argument("--history", default="benchmarks/benchmark-history.jsonl",
+                        help="JSON Lines file each run is appended to")
+    parser.add_argument("--baseline", help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", help="write this run's results as a baseline JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown/growth before flagging (0.2 = 20%%)")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None) -> int:
+    """Main execution function; returns 1 when regressions are flagged."""
+    args = parse_args(argv)
+    sizes = [int(float(size)) for size in args.sizes.split(",")]
+    formats = tuple(filter(None, args.formats.split(",")))
+
+    print("⏱️  Benchmarking Synthetic Case Note Generation")
+    print("=" * 50)
+
+    results = []
+    for size in sizes:
+        print(f"Size {size:,}...")
+        scalar = size <= args.scalar_max_size
+        stages = best_of([
+            benchmark_stages(size, args.seed, formats, track_memory=False, scalar=scalar)
+            for _ in range(max(1, args.repeats))
+        ])
+        if not args.no_memory:
+            traced = benchmark_stages(size, args.seed, formats, track_memory=True, scalar=scalar)
+            for timed, measured in zip(stages, traced):
+                timed["peak_bytes"] = measured["peak_bytes"]
+        results.extend(stages)
+        if not args.skip_main:
+            for batch in (True, False) if scalar else (True,):
+                results.extend(best_of([
+                    [benchmark_main(size, args.seed, args.workers, batch)] for _ in range(max(1, args.repeats))
+                ]))
+
+    print()
+    print_results(results)
+
+    run = {"timestamp": datetime.utcnow().isoformat() + "Z", "environment": environment_info()}
+    history_dir = os.path.dirname(args.history)
+    if history_dir:
+        os.makedirs(history_dir, exist_ok=True)
+    with open(args.history, 'a', encoding='utf-8') as f:
+        for result in results:
+            f.write(json.dumps({**run, **result}) + "\n")
+    print(f"\n✅ Results appended to: {args.history}")
+
+    if args.save_baseline:
+        baseline_dir = os.path.dirname(args.save_baseline)
+        if baseline_dir:
+            os.makedirs(baseline_dir, exist_ok=True)
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({**run, "results": results}, f, indent=2)
+        print(f"✅ Baseline saved: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)["results"]
+        regressions = find_regressions(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n⚠️  {len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            return 1
+        print(f"\n✅ No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
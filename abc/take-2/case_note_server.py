@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Synthetic Case Note Generator - Local Batch Service
+
+Serves batches of synthetic clients with notes over HTTP, on a TCP port or
+a Unix socket, so test suites and harnesses share one warm generator
+instead of each importing the module and regenerating data in-process.
+
+    python case_note_server.py --port 8765
+    curl 'http://127.0.0.1:8765/batch?size=1000&seed=7&scenario=housing_crisis'
+
+A batch is a slice of an unbounded batch-mode dataset for its seed, made
+of full shards of the server's shard size: clients from position `offset`,
+optionally keeping only clients with one of the requested scenarios. Up to
+any multiple of the shard size, that dataset is the one
+generate_synthetic_dataset(batch=True) returns with the same shard size.
+The same request always returns the same rows, and the X-Next-Offset header
+gives the offset to continue from. Shards are generated on a pool of
+background workers and kept in a bounded buffer; every request schedules
+the next `prefetch` shards of its seed, so readers paging through a dataset
+find them ready.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import socket
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Dict, List, Tuple
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from generate_synthetic_data import JSON_ENCODERS, SyntheticCaseNoteGenerator, iter_json_lines
+from population_spec import DEFAULT_SPEC_PATH
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Shard size of served datasets; smaller than the exporter's so the first
+# batch of a new seed is ready quickly
+DEFAULT_SERVICE_SHARD_SIZE = 10_000
+
+# Seeds whose generators stay cached (each holds its compiled spec)
+DEFAULT_CACHED_GENERATORS = 8
+
+# Largest batch a single request may ask for
+MAX_BATCH_SIZE = 1_000_000
+
+BATCH_FORMATS = {
+    "jsonl": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+class BatchService:
+    """Generates, buffers and serves batch-mode shards for any number of seeds.
+
+    Shards are produced by SyntheticCaseNoteGenerator._generate_shard on a
+    process pool (`workers > 1`) or a background thread, and kept in an LRU
+    buffer of up to `buffer_shards` shards across all seeds. Shards still
+    being generated are never evicted. Generators are built off the event
+    loop and the `cached_generators` most recently used seeds keep theirs.
+    """
+
+    def __init__(self, seed: int = 42, shard_size: int = DEFAULT_SERVICE_SHARD_SIZE, prefetch: int = 4,
+                 buffer_shards: int = 64, workers: int = 1, spec: str = None, json_encoder: str = "pandas",
+                 cached_generators: int = DEFAULT_CACHED_GENERATORS):
+        self.default_seed = seed
+        self.shard_size = shard_size
+        self.prefetch = prefetch
+        self.buffer_shards = max(buffer_shards, prefetch + 1)
+        self.spec = spec or DEFAULT_SPEC_PATH
+        self.json_encoder = json_encoder
+        self.cached_generators = max(cached_generators, 1)
+        self._generators = OrderedDict()
+        self._shards = OrderedDict()
+        if workers > 1:
+            self._pool = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=1)
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    async def generator(self, seed: int) -> SyntheticCaseNoteGenerator:
+        """The generator for a seed, built on a thread (the compiled spec comes from the spec cache).
+
+        Requests for a seed whose generator is still being built wait for
+        the same build; the least recently used generator is dropped once
+        more than `cached_generators` seeds are cached.
+        """
+        if seed in self._generators:
+            self._generators.move_to_end(seed)
+        else:
+            loop = asyncio.get_running_loop()
+            self._generators[seed] = loop.run_in_executor(
+                None, partial(SyntheticCaseNoteGenerator, seed=seed, spec=self.spec)
+            )
+            while len(self._generators) > self.cached_generators:
+                self._generators.popitem(last=False)
+        future = self._generators[seed]
+        try:
+            return await future
+        except Exception:
+            if self._generators.get(seed) is future:
+                del self._generators[seed]
+            raise
+
+    def shard(self, generator: SyntheticCaseNoteGenerator, index: int) -> asyncio.Future:
+        """Future for one shard of the generator's seed, scheduling its generation if it is not buffered."""
+        key = (generator.seed, index)
+        if key in self._shards:
+            self._shards.move_to_end(key)
+            return self._shards[key]
+
+        loop = asyncio.get_running_loop()
+        self._shards[key] = loop.run_in_executor(
+            self._pool, generator._generate_shard, index, index * self.shard_size, self.shard_size, 0
+        )
+        for old_key in list(self._shards):
+            if len(self._shards) <= self.buffer_shards:
+                break
+            if self._shards[old_key].done():
+                del self._shards[old_key]
+        return self._shards[key]
+
+    @staticmethod
+    def scenario_mask(generator: SyntheticCaseNoteGenerator, scenarios: List[str]) -> int:
+        """Bitmask of the requested scenarios; ValueError for unknown or never-embedded ones."""
+        names = list(generator.scenario_rates)
+        unknown = sorted(set(scenarios) - set(names))
+        if unknown:
+            raise ValueError(f"Unknown scenarios: {unknown} (choose from {', '.join(names)})")
+        if scenarios and not any(generator.scenario_rates[s] > 0 for s in scenarios):
+            raise ValueError(f"Scenarios {scenarios} are never embedded")
+        return sum(1 << names.index(s) for s in scenarios)
+
+    async def batch(self, size: int, seed: int = None, offset: int = 0,
+                    scenarios: List[str] = ()) -> Tuple[pd.DataFrame, int]:
+        """Up to `size` clients from position `offset` of the seed's dataset, and the offset after them.
+
+        With `scenarios`, only clients with at least one of them are kept and
+        shards are read until `size` of them are found.
+        """
+        seed = self.default_seed if seed is None else seed
+        generator = await self.generator(seed)
+        mask = self.scenario_mask(generator, list(scenarios))
+        frames, rows = [], 0
+        index, skip = divmod(offset, self.shard_size)
+        next_offset = offset
+        while rows < size:
+            for ahead in range(1, self.prefetch + 1):
+                self.shard(generator, index + ahead)
+            future = self.shard(generator, index)
+            try:
+                shard = await future
+            except Exception:
+                self._shards.pop((seed, index), None)
+                raise
+
+            positions = np.arange(skip, len(shard))
+            if mask:
+                positions = positions[shard["embedded_scenarios"].to_numpy()[skip:] & mask != 0]
+            positions = positions[:size - rows]
+            if len(positions):
+                frames.append(shard.iloc[positions])
+                rows += len(positions)
+            if rows < size:
+                index, skip = index + 1, 0
+                next_offset = index * self.shard_size
+            else:
+                next_offset = index * self.shard_size + int(positions[-1]) + 1
+
+        if not frames:
+            return generator._generate_shard(0, 0, 0, 0), next_offset
+        return pd.concat(frames, ignore_index=True), next_offset
+
+    def encode(self, clients: pd.DataFrame, generator: SyntheticCaseNoteGenerator, fmt: str) -> bytes:
+        """Serialize a batch as JSON Lines or CSV, with the export flattening of the other formats."""
+        export_df = generator._prepare_export_frame(clients)
+        if fmt == "csv":
+            return export_df.to_csv(index=False).encode("utf-8")
+        return "".join(block + "\n" for block in iter_json_lines(export_df, encoder=self.json_encoder)).encode("utf-8")
+
+    async def route(self, method: str, target: str) -> Tuple[int, Dict[str, str], bytes]:
+        """Handle one request; returns (status, headers, body)."""
+        if method != "GET":
+            return json_response(405, {"error": "Only GET is supported"})
+
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if url.path == "/health":
+            return json_response(200, {
+                "status": "ok",
+                "seeds": sorted(self._generators),
+                "buffered_shards": sum(future.done() for future in self._shards.values()),
+                "pending_shards": sum(not future.done() for future in self._shards.values())
+            })
+        if url.path != "/batch":
+            return json_response(404, {"error": f"Unknown path: {url.path}"})
+
+        size = int(query.get("size", 1000))
+        offset = int(query.get("offset", 0))
+        seed = int(query["seed"]) if "seed" in query else self.default_seed
+        fmt = query.get("format", "jsonl")
+        scenarios = [s for value in parse_qs(url.query).get("scenario", []) for s in value.split(",") if s]
+        if not 0 <= size <= MAX_BATCH_SIZE:
+            raise ValueError(f"size must be between 0 and {MAX_BATCH_SIZE}")
+        if offset < 0:
+            raise ValueError("offset must not be negative")
+        if fmt not in BATCH_FORMATS:
+            raise ValueError(f"Unsupported format: {fmt!r} (choose from {', '.join(BATCH_FORMATS)})")
+
+        clients, next_offset = await self.batch(size, seed=seed, offset=offset, scenarios=scenarios)
+        generator = await self.generator(seed)
+        body = await asyncio.get_running_loop().run_in_executor(None, self.encode, clients, generator, fmt)
+        headers = {
+            "Content-Type": BATCH_FORMATS[fmt] + "; charset=utf-8",
+            "X-Rows": str(len(clients)),
+            "X-Seed": str(seed),
+            "X-Next-Offset": str(next_offset)
+        }
+        return 200, headers, body
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve one HTTP/1.1 request per connection."""
+        try:
+            request_line = (await reader.readline()).decode("latin-1")
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            method, target, _ = request_line.split(" ", 2)
+            status, headers, body = await self.route(method, target)
+        except ValueError as error:
+            status, headers, body = json_response(400, {"error": str(error)})
+        except Exception as error:
+            status, headers, body = json_response(500, {"error": f"{type(error).__name__}: {error}"})
+
+        head = [f"HTTP/1.1 {status} {HTTP_REASONS[status]}", f"Content-Length: {len(body)}", "Connection: close"]
+        head += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+def json_response(status: int, payload: Dict) -> Tuple[int, Dict[str, str], bytes]:
+    return status, {"Content-Type": "application/json"}, json.dumps(payload).encode("utf-8")
+
+
+async def serve(service: BatchService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, unix_socket: str = None):
+    """Run the service until cancelled, warming the buffer with the default seed's first shards."""
+    if unix_socket:
+        server = await asyncio.start_unix_server(service.handle, path=unix_socket)
+        address = f"unix:{unix_socket}"
+    else:
+        server = await asyncio.start_server(service.handle, host=host, port=port)
+        address = f"http://{host}:{port}"
+
+    generator = await service.generator(service.default_seed)
+    for index in range(service.prefetch):
+        service.shard(generator, index)
+    print(f"✅ Serving synthetic case note batches on {address} (seed {service.default_seed})")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+        if unix_socket and os.path.exists(unix_socket):
+            os.remove(unix_socket)
+
+
+def fetch_batch(size: int = 1000, seed: int = None, offset: int = 0, scenarios: List[str] = (),
+                host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, unix_socket: str = None,
+                timeout: float = 120) -> pd.DataFrame:
+    """Request a batch from a running server and return it as a DataFrame.
+
+    The X-Next-Offset header of the response is kept in df.attrs["next_offset"].
+    """
+    query = {"size": size, "offset": offset}
+    if seed is not None:
+        query["seed"] = seed
+    if scenarios:
+        query["scenario"] = ",".join(scenarios)
+    request = f"GET /batch?{urlencode(query)} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n"
+
+    if unix_socket:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(timeout)
+        connection.connect(unix_socket)
+    else:
+        connection = socket.create_connection((host, port), timeout=timeout)
+    with connection:
+        connection.sendall(request.encode("latin-1"))
+        response = b"".join(iter(lambda: connection.recv(1 << 20), b""))
+
+    head, body = response.split(b"\r\n\r\n", 1)
+    status_line, *header_lines = head.decode("latin-1").split("\r\n")
+    headers = dict(line.split(": ", 1) for line in header_lines)
+    if int(status_line.split(" ", 2)[1]) != 200:
+        raise RuntimeError(f"Batch request failed: {status_line}: {body.decode('utf-8')}")
+
+    clients = pd.read_json(io.StringIO(body.decode("utf-8")), lines=True, dtype=False)
+    clients.attrs["next_offset"] = int(headers["X-Next-Offset"])
+    return clients
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    """Parse command-line options."""
+    parser = argparse.ArgumentParser(description="Serve synthetic case note batches over HTTP.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP port to listen on")
+    parser.add_argument("--unix-socket", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--seed", type=int, default=42, help="seed of requests that do not give one")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SERVICE_SHARD_SIZE,
+                        help="clients per generated shard (part of what defines a seed's dataset)")
+    parser.add_argument("--prefetch", type=int, default=4, help="shards generated ahead of each request")
+    parser.add_argument("--buffer-shards", type=int, default=64, help="generated shards kept in memory")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes generating shards")
+    parser.add_argument("--cached-generators", type=int, default=DEFAULT_CACHED_GENERATORS,
+                        help="seeds whose generators are kept between requests")
+    parser.add_argument("--spec", default=DEFAULT_SPEC_PATH, help="YAML population spec")
+    parser.add_argument("--json-encoder", default="pandas", choices=JSON_ENCODERS, help="encoder for JSON Lines batches")
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] = None):
+    """Main execution function."""
+    args = parse_args(argv)
+    service = BatchService(
+        seed=args.seed, shard_size=args.shard_size, prefetch=args.prefetch, buffer_shards=args.buffer_shards,
+        workers=args.workers, spec=args.spec, json_encoder=args.json_encoder,
+        cached_generators=args.cached_generators
+    )
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.unix_socket))
+    except KeyboardInterrupt:
+        print("\n✅ Server stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Synthetic Case Note Generator - Client Identity
+
+Builds person_oid strings from a client's global row index. Because the
+index is fixed by the shard plan, every shard can format its own ids
+without coordinating with other workers, and no two clients ever share
+an id. The "sequential" scheme numbers clients CN-001, CN-002, ...; the
+"permuted" scheme maps the index through a keyed Feistel permutation of
+the id space [0, 10**digits), giving fixed-width, non-sequential ids that
+are still collision-free and can be mapped back to the row index.
+"""
+
+import numpy as np
+import pandas as pd
+
+OID_SCHEMES = ("sequential", "permuted")
+
+# Feistel rounds; four rounds of a good round function give a well-mixed permutation
+FEISTEL_ROUNDS = 4
+
+# uint64 id space: 10**18 < 2**60, so both Feistel halves fit in 30 bits
+MAX_OID_DIGITS = 18
+
+MIX_MULTIPLIERS = (np.uint64(0xBF58476D1CE4E5B9), np.uint64(0x94D049BB133111EB))
+
+
+def format_numbers(prefix: str, numbers: np.ndarray, width: int) -> np.ndarray:
+    """prefix + zero-padded decimal numbers of exactly `width` digits, as an object array of str.
+
+    Builds the ASCII digit matrix directly, which is several times cheaper
+    than formatting each number separately.
+    """
+    prefix_bytes = np.frombuffer(prefix.encode("ascii"), dtype=np.uint8)
+    buffer = np.empty((len(numbers), len(prefix_bytes) + width), dtype=np.uint8)
+    buffer[:, :len(prefix_bytes)] = prefix_bytes
+    powers = np.uint64(10) ** np.arange(width - 1, -1, -1, dtype=np.uint64)
+    buffer[:, len(prefix_bytes):] = (numbers[:, None] // powers % np.uint64(10)).astype(np.uint8) + ord("0")
+    return buffer.view(f"S{buffer.shape[1]}").ravel().astype(f"U{buffer.shape[1]}").astype(object)
+
+
+def _mix64(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer over a uint64 array (multiplication wraps modulo 2**64)."""
+    values = (values ^ (values >> np.uint64(30))) * MIX_MULTIPLIERS[0]
+    values = (values ^ (values >> np.uint64(27))) * MIX_MULTIPLIERS[1]
+    return values ^ (values >> np.uint64(31))
+
+
+class KeyedPermutation:
+    """A keyed bijection of [0, domain), vectorized over uint64 arrays.
+
+    A balanced Feistel network permutes the smallest even-width power-of-two
+    range covering the domain; values that land outside the domain are
+    encrypted again (cycle walking) until they fall inside it, which keeps
+    the mapping a bijection of the domain itself.
+    """
+
+    def __init__(self, domain: int, key: int, rounds: int = FEISTEL_ROUNDS):
+        if not 1 <= domain <= 1 << 60:
+            raise ValueError(f"Permutation domain must be between 1 and 2**60, got {domain}")
+        self.domain = domain
+        self.half_bits = max(1, ((domain - 1).bit_length() + 1) // 2)
+        self.half_mask = np.uint64((1 << self.half_bits) - 1)
+        self.round_keys = np.random.SeedSequence(key).generate_state(rounds, dtype=np.uint64)
+
+    def _rounds(self, values: np.ndarray, inverse: bool = False) -> np.ndarray:
+        shift = np.uint64(self.half_bits)
+        left, right = values >> shift, values & self.half_mask
+        if inverse:
+            for key in self.round_keys[::-1]:
+                left, right = right ^ (_mix64(left ^ key) & self.half_mask), left
+        else:
+            for key in self.round_keys:
+                left, right = right, left ^ (_mix64(right ^ key) & self.half_mask)
+        return (left << shift) | right
+
+    def _walk(self, values: np.ndarray, inverse: bool) -> np.ndarray:
+        values = np.asarray(values, dtype=np.uint64)
+        if len(values) and int(values.max()) >= self.domain:
+            raise ValueError(f"Values must be below the permutation domain {self.domain}")
+        result = self._rounds(values, inverse)
+        outside = np.flatnonzero(result >= np.uint64(self.domain))
+        while len(outside):
+            result[outside] = self._rounds(result[outside], inverse)
+            outside = outside[result[outside] >= np.uint64(self.domain)]
+        return result
+
+    def __call__(self, values: np.ndarray) -> np.ndarray:
+        """Permuted values."""
+        return self._walk(values, inverse=False)
+
+    def inverse(self, values: np.ndarray) -> np.ndarray:
+        """Original values of permuted ones."""
+        return self._walk(values, inverse=True)
+
+
+class PersonOidFormat:
+    """person_oid strings for global client indices, under one identity scheme.
+
+    Small and picklable, so worker processes and ClientColumns blocks can
+    carry it. For "sequential" ids `digits` is the minimum zero-padded
+    width; for "permuted" ids it fixes the width and the id space.
+    """
+
+    def __init__(self, scheme: str = "sequential", prefix: str = "CN-", digits: int = 3, key: int = 0):
+        if scheme not in OID_SCHEMES:
+            raise ValueError(f"Unsupported person_oid scheme: {scheme!r} (choose from {', '.join(OID_SCHEMES)})")
+        self.scheme = scheme
+        self.prefix = prefix
+        self.digits = digits
+        self.permutation = KeyedPermutation(10 ** digits, key) if scheme == "permuted" else None
+
+    @property
+    def capacity(self) -> int:
+        """Number of distinct ids the scheme can produce."""
+        return 10 ** self.digits if self.permutation is not None else np.iinfo(np.int64).max
+
+    def numbers(self, start: int, count: int) -> np.ndarray:
+        """The id numbers of clients start .. start + count - 1."""
+        if start + count > self.capacity:
+            raise ValueError(
+                f"{start + count} clients exceed the {self.capacity} {self.digits}-digit person_oids; raise oid_digits"
+            )
+        indices = np.arange(start, start + count, dtype=np.uint64)
+        if self.permutation is None:
+            return indices + np.uint64(1)
+        return self.permutation(indices)
+
+    def __call__(self, start: int, count: int) -> np.ndarray:
+        """person_oid strings (object array) for clients start .. start + count - 1."""
+        numbers = self.numbers(start, count)
+        if self.permutation is not None:
+            return format_numbers(self.prefix, numbers, self.digits)
+        # Sequential numbers only widen past `digits`: format each run of equal width
+        oids = np.empty(count, dtype=object)
+        first, last = start + 1, start + count
+        splits = [10 ** width - first for width in range(self.digits, 20) if first < 10 ** width <= last]
+        for low, high in zip([0, *splits], [*splits, count]):
+            width = max(self.digits, len(str(first + low)))
+            oids[low:high] = format_numbers(self.prefix, numbers[low:high], width)
+        return oids
+
+    def index_of(self, oids) -> np.ndarray:
+        """Global client indices of person_oid strings (the inverse of __call__)."""
+        numbers = pd.Series(oids, dtype=object).str.slice(len(self.prefix)).astype(np.uint64).to_numpy()
+        if self.permutation is None:
+            return (numbers - np.uint64(1)).astype(np.int64)
+        return self.permutation.inverse(numbers).astype(np.int64)
@@ -7,184 +7,704 @@ This script generates realistic synthetic case notes for Alberta-like social ser
 clients based on the population parameters and archetypes defined in the ABC workflow.
 """
 
+import argparse
+import gzip
+import hashlib
+import io
+import numpy as np
 import pandas as pd
 import json
+import multiprocessing
+import tempfile
 import yaml
 import random
 import uuid
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple
+from statistics import NormalDist
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Union
 import os
+import time
+import tracemalloc
+from collections import Counter, deque
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
 
-# Set random seed for reproducibility
-random.seed(42)
+import client_identity
+import generation_checkpoint
+import label_index
+import note_diversity
+import scenario_rewriter
+from client_identity import PersonOidFormat
+from generation_checkpoint import CHECKPOINT_DIR, GenerationCheckpoint, cached_outputs, record_outputs
+from label_index import INDEX_FILE, INDEXED_FORMATS, LABEL_FIELDS, LabelIndex, LabelSpill, RowOffsetWriter
+from note_diversity import NoteDiversity
+from population_spec import (
+    DEFAULT_SPEC_PATH, CategoricalTable, apportion, archetype_complexity_weights, load_compiled_spec,
+    source_digest
+)
+from scenario_rewriter import ScenarioRewriter
 
-class SyntheticCaseNoteGenerator:
-    def __init__(self):
-        """Initialize the generator with population parameters from ABC workflow."""
-        
-        # Population parameters from Demographics Architect output
-        self.age_distribution = {
-            (18, 24): 0.15,  # 15%
-            (25, 34): 0.20,  # 20% 
-            (35, 44): 0.25,  # 25%
-            (45, 54): 0.25,  # 25%
-            (55, 64): 0.15   # 15%
-        }
+# pyarrow is only needed for the columnar (Parquet / Arrow IPC) exports
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = feather = pq = None
+
+# orjson is an optional faster encoder for the JSON / JSON Lines exports
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# zstandard is optional for zstd-compressed text exports (pyarrow's codec is the fallback)
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Clients per shard in batch/parallel generation. Shard boundaries (and so the
+# RNG stream each client is drawn from) depend only on this size, never on the
+# number of workers, which keeps output identical for a given seed.
+DEFAULT_SHARD_SIZE = 100_000
+
+# Output file names for the incremental (streaming) exporter
+STREAM_FORMATS = {
+    "csv": "synthetic-case-notes.csv",
+    "jsonl": "synthetic-case-notes.jsonl",
+    "parquet": "synthetic-case-notes.parquet",
+    "feather": "synthetic-case-notes.arrow"
+}
+
+# Output file names for the columnar exporter ("feather" is the Arrow IPC file format)
+COLUMNAR_FORMATS = {
+    "parquet": "synthetic-case-notes.parquet",
+    "feather": "synthetic-case-notes.arrow"
+}
+
+# Encoders for the JSON / JSON Lines exports and the rows serialized per block
+JSON_ENCODERS = ("pandas", "orjson", "json")
+JSON_CHUNK_SIZE = 50_000
+
+# Source files whose contents key the spec cache, checkpoints and output cache
+CODE_FILES = (
+    os.path.abspath(__file__), scenario_rewriter.__file__, generation_checkpoint.__file__, label_index.__file__,
+    client_identity.__file__, note_diversity.__file__
+)
+
+# Compression codecs for the text exports (csv / json / jsonl) and their file suffixes
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+TEXT_FORMATS = ("csv", "json", "jsonl")
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# Pools for concurrent export_data writers
+EXPORT_EXECUTORS = ("thread", "process")
+
+# Distinct-note ratio below which, or share of cases in near-duplicate note
+# clusters above which, the validation report flags the notes as repetitive
+LOW_NOTE_DIVERSITY = 0.5
+HIGH_NEAR_DUPLICATE_SHARE = 0.5
+
+# Number of set bits for every uint8 value (risk burden from a risk-factor bitmask)
+POPCOUNT_UINT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def shard_plan(target_count: int, shard_size: int, start: int = 0,
+               first_shard: int = 0) -> List[Tuple[int, int, int, int]]:
+    """Split clients start..target_count into (shard_index, start, count, target_count) tuples.
+
+    A non-zero `start` / `first_shard` continues a run that already produced
+    `start` clients in `first_shard` shards (resume or append).
+    """
+    return [
+        (shard_index, shard_start, min(shard_size, target_count - shard_start), target_count)
+        for shard_index, shard_start in enumerate(range(start, target_count, shard_size), first_shard)
+    ]
+
+
+def iter_ordered(func, arg_tuples: List[Tuple], workers: int = 1) -> Iterator:
+    """Yield func(*args) for each tuple in order, optionally on a process pool.
+
+    At most two tasks per worker are in flight, so results are consumed as
+    they arrive instead of accumulating in memory.
+    """
+    if workers <= 1 or len(arg_tuples) <= 1:
+        for args in arg_tuples:
+            yield func(*args)
+        return
+    
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = deque()
+        for args in arg_tuples:
+            pending.append(executor.submit(func, *args))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def run_timed_writer(writer: Callable[[], Union[str, Tuple[str, np.ndarray]]]) -> Dict:
+    """Run an output writer and return its path, bytes written and seconds taken.
+
+    Writers return their path, or (path, row offsets) when they record where
+    each row starts for the label index; the offsets are kept as row_offsets.
+    """
+    start = time.perf_counter()
+    result = writer()
+    path, offsets = result if isinstance(result, tuple) else (result, None)
+    entry = {"path": path, "bytes": os.path.getsize(path), "seconds": round(time.perf_counter() - start, 6)}
+    if offsets is not None:
+        entry["row_offsets"] = offsets
+    return entry
+
+
+# Writers of the current run_forked() call; forked processes inherit them,
+# with the frame they read, instead of receiving a pickled copy
+_forked_writers = {}
+
+
+def _run_forked_writer(name: str) -> Dict:
+    return run_timed_writer(_forked_writers[name])
+
+
+def fork_available() -> bool:
+    """Whether this platform can start processes with fork (not on Windows, for instance)."""
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def run_forked(writers: Dict[str, Callable[[], str]], workers: int) -> Dict[str, Dict]:
+    """run_timed_writer() for each writer on a pool of forked processes."""
+    if not fork_available():
+        raise ValueError("The process export executor needs the fork start method, which this platform lacks")
+    global _forked_writers
+    _forked_writers = writers
+    try:
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=min(workers, len(writers)), mp_context=context) as executor:
+            futures = {name: executor.submit(_run_forked_writer, name) for name in writers}
+            return {name: future.result() for name, future in futures.items()}
+    finally:
+        _forked_writers = {}
+
+
+def encode_scenarios(scenario_lists: Iterable[List[str]], scenario_names: List[str]) -> np.ndarray:
+    """Encode per-client scenario lists as a uint8 bitmask (bit i = scenario_names[i]).
+
+    A column that already holds bitmasks (integer dtype, as in batch frames)
+    is returned as uint8 without re-encoding.
+    """
+    if isinstance(scenario_lists, (pd.Series, np.ndarray)) and pd.api.types.is_integer_dtype(scenario_lists.dtype):
+        return np.asarray(scenario_lists, dtype=np.uint8)
+    bits = {scenario: 1 << i for i, scenario in enumerate(scenario_names)}
+    return np.fromiter((sum(bits[s] for s in scenarios) for scenarios in scenario_lists), dtype=np.uint8)
+
+
+def open_text_output(path: str, compression: str = None):
+    """Open `path` for UTF-8 text writing, through a gzip or zstd compressor if asked."""
+    if compression is None:
+        return open(path, 'w', encoding='utf-8', newline='')
+    if compression == "gzip":
+        return gzip.open(path, 'wt', encoding='utf-8', newline='', compresslevel=GZIP_LEVEL)
+    if compression == "zstd":
+        if zstandard is not None:
+            return zstandard.open(path, 'wt', encoding='utf-8', newline='',
+                                  cctx=zstandard.ZstdCompressor(level=ZSTD_LEVEL))
+        if pa is not None:
+            return io.TextIOWrapper(pa.CompressedOutputStream(path, "zstd"), encoding='utf-8', newline='')
+        raise ImportError("zstd compression requires zstandard or pyarrow (pip install zstandard)")
+    raise ValueError(f"Unsupported compression: {compression!r} (choose from {', '.join(COMPRESSION_SUFFIXES)})")
+
+
+def iter_json_lines(export_df: pd.DataFrame, encoder: str = "pandas",
+                    chunk_size: int = JSON_CHUNK_SIZE) -> Iterator[str]:
+    """Yield blocks of compact JSON records, one record per line, `chunk_size` rows at a time.
+
+    "pandas" uses DataFrame.to_json (which escapes "/" as "\\/"), "orjson"
+    the optional orjson package, and "json" the standard library. Only one
+    block of records is materialized at a time.
+    """
+    if encoder not in JSON_ENCODERS:
+        raise ValueError(f"Unsupported JSON encoder: {encoder!r} (choose from {', '.join(JSON_ENCODERS)})")
+    if encoder == "orjson" and orjson is None:
+        raise ImportError("orjson is required for the orjson encoder (pip install orjson)")
+    
+    names = [str(name) for name in export_df.columns]
+    for start in range(0, len(export_df), chunk_size):
+        chunk = export_df.iloc[start:start + chunk_size]
+        if encoder == "pandas":
+            yield chunk.to_json(orient="records", lines=True, force_ascii=False).rstrip("\n")
+            continue
+        # Build records from per-column lists; much faster than to_dict("records")
+        records = (dict(zip(names, row)) for row in zip(*(chunk[name].tolist() for name in chunk.columns)))
+        if encoder == "orjson":
+            yield "\n".join(orjson.dumps(record).decode("utf-8") for record in records)
+        else:
+            yield "\n".join(json.dumps(record, ensure_ascii=False) for record in records)
+
+
+class DatasetMetrics:
+    """Mergeable counts and sums behind the dataset metadata and validation report.
+
+    Each chunk of clients is folded in with one pass per column; accumulators
+    built for different shards or streaming chunks combine with merge().
+    Case notes feed a NoteDiversity accumulator (see note_diversity).
+    """
+    
+    CATEGORICAL_COLUMNS = ("gender", "complexity_level", "location")
+    
+    def __init__(self, scenario_names: List[str], risk_factor_names: List[str] = ()):
+        self.scenario_names = list(scenario_names)
+        self.risk_factor_names = list(risk_factor_names)
+        self.total = 0
+        self.age_sum = 0
+        self.counts = {column: Counter() for column in self.CATEGORICAL_COLUMNS}
+        self.scenario_counts = Counter()
+        self.risk_factor_counts = Counter()
+        self.diversity = NoteDiversity()
+    
+    @classmethod
+    def from_frame(cls, clients: pd.DataFrame, scenario_names: List[str],
+                   risk_factor_names: List[str] = ()) -> "DatasetMetrics":
+        """Build an accumulator for one chunk of clients."""
+        return cls(scenario_names, risk_factor_names).update(clients)
+    
+    def update(self, clients: pd.DataFrame) -> "DatasetMetrics":
+        """Fold one chunk of clients into the running totals."""
+        self.total += len(clients)
+        self.age_sum += int(clients["age"].sum())
+        for column, counts in self.counts.items():
+            # Categorical columns also report unused categories; skip those
+            value_counts = clients[column].value_counts()
+            counts.update(value_counts[value_counts > 0].to_dict())
         
-        self.gender_distribution = {"Female": 0.55, "Male": 0.45}
-        self.location_distribution = {"Urban": 0.75, "Rural": 0.25}
+        masks = encode_scenarios(clients["embedded_scenarios"], self.scenario_names)
+        for bit, scenario in enumerate(self.scenario_names):
+            self.scenario_counts[scenario] += int(((masks >> bit) & 1).sum())
         
-        # Complexity distribution from user requirements
-        self.complexity_distribution = {
-            1: 0.25,  # Stable: 25%
-            2: 0.45,  # Moderate: 45%
-            3: 0.25,  # High: 25%
-            4: 0.05   # Crisis: 5%
-        }
+        if "risk_factors" in clients:
+            risk_masks = clients["risk_factors"].to_numpy()
+            for bit, factor in enumerate(self.risk_factor_names):
+                self.risk_factor_counts[factor] += int(((risk_masks >> bit) & 1).sum())
         
-        # Risk factors and co-occurrence patterns from Risk Factor Modeler
-        self.risk_factors = {
-            "mental_health": 0.30,
-            "substance_use": 0.20,
-            "housing_instability": 0.25,
-            "medical_complexity": 0.15,
-            "justice_involvement": 0.10,
-            "dependent_care": 0.30,
-            "employment_barriers": 0.70
-        }
+        if "case_note" in clients:
+            self.diversity.update(clients["case_note"])
+        return self
+    
+    def merge(self, other: "DatasetMetrics") -> "DatasetMetrics":
+        """Add another accumulator's totals into this one."""
+        self.total += other.total
+        self.age_sum += other.age_sum
+        for column, counts in self.counts.items():
+            counts.update(other.counts[column])
+        self.scenario_counts.update(other.scenario_counts)
+        self.risk_factor_counts.update(other.risk_factor_counts)
+        self.diversity.merge(other.diversity)
+        return self
+    
+    def to_dict(self) -> Dict:
+        """JSON-serializable totals; counters become [key, count] pairs so integer keys survive."""
+        def pairs(counts: Counter) -> List[list]:
+            return [[key.item() if isinstance(key, np.generic) else key, int(count)] for key, count in counts.items()]
         
-        # Client archetypes from Archetype Designer (simplified)
-        self.archetypes = {
-            "urban_young_adult": {"age_range": (18, 25), "complexity": 2, "location": "Urban"},
-            "rural_single_parent": {"age_range": (26, 40), "complexity": 3, "location": "Rural"},
-            "urban_middle_aged": {"age_range": (35, 50), "complexity": 2, "location": "Urban"},
-            "complex_older_adult": {"age_range": (45, 64), "complexity": 3, "location": "Urban"},
-            "crisis_client": {"age_range": (25, 45), "complexity": 4, "location": "Urban"},
-            "stable_worker": {"age_range": (30, 55), "complexity": 1, "location": "Urban"},
-            "rural_isolated": {"age_range": (40, 64), "complexity": 3, "location": "Rural"},
-            "young_family": {"age_range": (22, 35), "complexity": 2, "location": "Urban"}
+        return {
+            "scenario_names": self.scenario_names,
+            "risk_factor_names": self.risk_factor_names,
+            "total": self.total,
+            "age_sum": self.age_sum,
+            "counts": {column: pairs(counts) for column, counts in self.counts.items()},
+            "scenario_counts": pairs(self.scenario_counts),
+            "risk_factor_counts": pairs(self.risk_factor_counts),
+            "diversity": self.diversity.to_dict()
         }
-        
-        # Writer styles from Variation Writer
-        self.writer_styles = {
-            "new_worker": 0.30,
-            "experienced_worker": 0.50,
-            "senior_worker": 0.20
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "DatasetMetrics":
+        """Rebuild an accumulator saved with to_dict()."""
+        metrics = cls(data["scenario_names"], data["risk_factor_names"])
+        metrics.total = data["total"]
+        metrics.age_sum = data["age_sum"]
+        for column, pairs in data["counts"].items():
+            metrics.counts[column] = Counter(dict(map(tuple, pairs)))
+        metrics.scenario_counts = Counter(dict(map(tuple, data["scenario_counts"])))
+        metrics.risk_factor_counts = Counter(dict(map(tuple, data["risk_factor_counts"])))
+        metrics.diversity = NoteDiversity.from_dict(data["diversity"])
+        return metrics
+    
+    def proportions(self, column: str) -> Dict:
+        """Share of clients per category, most common first (like value_counts(normalize=True))."""
+        return {key: count / self.total for key, count in self.counts[column].most_common()}
+    
+    def risk_factor_prevalence(self) -> Dict[str, float]:
+        """Share of clients with each risk factor."""
+        return {
+            factor: self.risk_factor_counts[factor] / self.total if self.total else 0.0
+            for factor in self.risk_factor_names
         }
+    
+    def average_age(self) -> float:
+        return self.age_sum / self.total if self.total else 0.0
+    
+    def scenario_summary(self, scenario: str) -> str:
+        """Format a scenario count as e.g. "75 cases (15.0%)"."""
+        count = self.scenario_counts[scenario]
+        percentage = count / self.total * 100 if self.total else 0.0
+        return f"{count} cases ({percentage:.1f}%)"
+
+
+class StageProfiler:
+    """Opt-in per-stage timing: wall time, CPU time, rows/sec and tracemalloc peak.
+
+    Each finished stage becomes a record dict that is kept in `records` and
+    passed to `hook` (e.g. a logger or metrics client), if one is given.
+    Stages are not nested, since each one resets the tracemalloc peak.
+    """
+    
+    def __init__(self, track_memory: bool = True, hook: Callable[[Dict], None] = None):
+        self.track_memory = track_memory
+        self.hook = hook
+        self.records = []
+    
+    def __getstate__(self):
+        # Worker processes get a copy without the hook or past records (the
+        # hook may not be picklable); their records travel back with the shard
+        return {"track_memory": self.track_memory, "hook": None, "records": []}
+    
+    @contextmanager
+    def stage(self, name: str, rows: int = None) -> Iterator[Dict]:
+        """Time the enclosed block; the yielded record's "rows" may be set inside it."""
+        record = {"stage": name, "rows": rows}
+        started_tracing = False
+        if self.track_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_seconds"] = time.perf_counter() - wall
+            record["cpu_seconds"] = time.process_time() - cpu
+            record["peak_bytes"] = tracemalloc.get_traced_memory()[1] if self.track_memory else None
+            if started_tracing:
+                tracemalloc.stop()
+            self.add([record])
+    
+    def add(self, records: Iterable[Dict]):
+        """Keep finished records (e.g. from a worker process) and pass each to the hook."""
+        for record in records:
+            self.records.append(record)
+            if self.hook is not None:
+                self.hook(record)
+    
+    def summary(self) -> Dict[str, Dict]:
+        """Totals per stage name in first-seen order (peak_bytes is the largest single peak)."""
+        stages = {}
+        for record in self.records:
+            total = stages.setdefault(record["stage"], {
+                "calls": 0, "rows": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "peak_bytes": None
+            })
+            total["calls"] += 1
+            total["rows"] += record["rows"] or 0
+            total["wall_seconds"] += record["wall_seconds"]
+            total["cpu_seconds"] += record["cpu_seconds"]
+            if record["peak_bytes"] is not None:
+                total["peak_bytes"] = max(total["peak_bytes"] or 0, record["peak_bytes"])
         
-        # Case note templates by complexity and writer style
-        self.note_templates = self._initialize_note_templates()
+        for total in stages.values():
+            total["rows_per_second"] = round(total["rows"] / total["wall_seconds"], 1) if total["wall_seconds"] else None
+            total["wall_seconds"] = round(total["wall_seconds"], 6)
+            total["cpu_seconds"] = round(total["cpu_seconds"], 6)
+        return stages
+
+
+def profile_stage(profiler: StageProfiler, name: str, rows: int = None):
+    """profiler.stage(name, rows), or a no-op context when profiling is off."""
+    if profiler is None:
+        return nullcontext({})
+    return profiler.stage(name, rows)
+
+
+def code_dtype(category_count: int) -> np.dtype:
+    """Smallest integer dtype pandas keeps Categorical codes in (so from_codes does not recast them)."""
+    for dtype in (np.int8, np.int16, np.int32):
+        if category_count < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+class ClientColumns:
+    """Struct-of-arrays storage for a block of clients.
+
+    Categorical fields (names, gender, location, archetype, writer style) are
+    small integer codes into category arrays shared by every block; age and
+    complexity_level are int8 and risk_factors / embedded_scenarios uint8
+    bitmasks. A client takes about a dozen bytes instead of a dict of
+    Python objects with its own scenario list. to_frame() wraps the arrays
+    in a DataFrame without copying them (see to_frame for how to check).
+    person_oids are formatted from the block's global start_index by
+    `oid_format`.
+    """
+    
+    FIELDS = (
+        "first_name", "last_name", "gender", "age", "location", "complexity_level",
+        "archetype_id", "writer_style", "risk_factors", "embedded_scenarios"
+    )
+    
+    def __init__(self, arrays: Dict[str, np.ndarray], categories: Dict[str, np.ndarray], start_index: int = 0,
+                 oid_format: PersonOidFormat = None):
+        self.arrays = arrays
+        self.categories = categories
+        self.start_index = start_index
+        self.oid_format = oid_format or PersonOidFormat()
+    
+    def __len__(self) -> int:
+        return len(self.arrays["age"])
+    
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.arrays[name]
+    
+    def __setitem__(self, name: str, values: np.ndarray):
+        self.arrays[name] = values
+    
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the per-client arrays (the shared categories are not counted)."""
+        return sum(values.nbytes for values in self.arrays.values())
+    
+    def person_oids(self) -> np.ndarray:
+        """person_oid strings (CN-001, ...), built on demand from start_index."""
+        return self.oid_format(self.start_index, len(self))
+    
+    def to_frame(self) -> pd.DataFrame:
+        """DataFrame over the same arrays: Categorical columns over the codes, numeric columns as-is.
+
+        Only the person_oid strings are allocated; embedded_scenarios stays a
+        uint8 bitmask (bit i = i-th scenario). Codes are stored in
+        code_dtype() so from_codes keeps them as they are: df[name].array.codes
+        shares memory with self[name] (df[name].cat.codes returns a copy).
+        """
+        columns = {"person_oid": self.person_oids()}
+        for name in self.FIELDS:
+            if name in self.categories:
+                columns[name] = pd.Categorical.from_codes(
+                    self.arrays[name], categories=self.categories[name], validate=False
+                )
+            else:
+                columns[name] = self.arrays[name]
+        return pd.DataFrame(columns, copy=False)
+
+
+class SyntheticCaseNoteGenerator:
+    def __init__(self, seed: int = 42, profiler: StageProfiler = None, spec: str = None,
+                 spec_cache_dir: str = None, use_spec_cache: bool = True):
+        """Initialize the generator with population parameters from ABC workflow.
+
+        Parameters are read from the YAML population spec at `spec` (default
+        population-spec.yml) and compiled into sampling tables, cached in
+        `spec_cache_dir` unless `use_spec_cache` is False. Pass a
+        StageProfiler to time each generation and export stage; its
+        per-stage totals are added to the metadata as `generation_profile`.
+        """
         
-        # Names for fictional clients
-        self.first_names = {
-            "Female": ["Sarah", "Jennifer", "Amanda", "Michelle", "Lisa", "Karen", "Susan", "Patricia", "Angela", "Nicole"],
-            "Male": ["Michael", "David", "Christopher", "Matthew", "James", "Robert", "Daniel", "John", "Mark", "Kevin"]
-        }
-        self.last_names = ["Johnson", "Williams", "Brown", "Jones", "Miller", "Davis", "Garcia", "Rodriguez", "Wilson", "Martinez"]
+        # Per-instance RNGs seeded for reproducibility: `random` for the
+        # per-client path, NumPy for the batch (columnar) path
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.rng = np.random.default_rng(seed)
+        self.profiler = profiler
+        
+        # Population parameters and the sampling tables compiled from them
+        self._load_population_spec(spec or DEFAULT_SPEC_PATH, spec_cache_dir, use_spec_cache)
+        
+        # person_oids from each client's global index (keyed by the seed unless the spec sets oid_key)
+        oid_key = self.identity["oid_key"]
+        self.oid_format = PersonOidFormat(
+            self.identity["oid_scheme"], self.identity["oid_prefix"], self.identity["oid_digits"],
+            key=self.seed if oid_key is None else oid_key
+        )
 
-    def _initialize_note_templates(self) -> Dict:
-        """Initialize case note templates based on complexity and writer style."""
-        return {
-            1: {  # Stable
-                "new_worker": [
-                    "Client attended scheduled appointment today. Reports stable housing situation in subsidized unit. Employment search is ongoing with participation in skills development program. Mental health appears stable with continued medication compliance. Client expressed gratitude for support services. Next appointment scheduled for two weeks to monitor progress with job search activities.",
-                    "Met with client for routine check-in. Housing remains stable in current rental unit. Client has been attending job training program consistently for past month. Reports no significant concerns with mental health or substance use. Discussed budgeting strategies and community resources. Follow-up appointment set for next month."
-                ],
-                "experienced_worker": [
-                    "Routine appointment. Client stable, housing secure. Job training progressing well. Next: 2 weeks.",
-                    "Check-in completed. No major concerns. Employment program engagement good. Housing stable. Next appointment scheduled."
-                ],
-                "senior_worker": [
-                    "Client stable. Housing and employment supports working well. Continue current plan.",
-                    "Stable presentation. Good engagement with services. Maintain current supports."
-                ]
-            },
-            2: {  # Moderate
-                "new_worker": [
-                    "Client presented for scheduled appointment, appearing somewhat stressed but cooperative. Reports ongoing challenges with childcare arrangements affecting work schedule. Mental health symptoms of anxiety have increased this week due to financial pressures. Discussed coping strategies and reviewed medication compliance. Referred to childcare subsidy program. Housing situation remains stable. Plan to follow up in one week to assess progress.",
-                    "Met with client who reported mixed progress this month. Employment at part-time position continues but income insufficient for expenses. Mild depressive symptoms noted, though client engaged well in discussion. Exploring additional income support options. Housing stable but client concerned about rising rent costs. Scheduled follow-up for two weeks."
-                ],
-                "experienced_worker": [
-                    "Client reports work challenges - childcare issues affecting schedule. Anxiety increased. Referred childcare support. Follow-up weekly.",
-                    "Part-time work continuing. Financial stress evident. Depression mild but manageable. Reviewing support options. 2-week follow-up."
-                ],
-                "senior_worker": [
-                    "Moderate stress, childcare barriers. Refer supports. Weekly check-in needed.",
-                    "Financial pressures affecting stability. Link additional resources. Monitor closely."
-                ]
-            },
-            3: {  # High
-                "new_worker": [
-                    "Client arrived 20 minutes late for appointment, appearing disheveled and agitated. Reports eviction notice received this week - 30 days to vacate current residence. Substance use has escalated over past month, client admits to drinking daily. Mental health significantly deteriorated with reports of panic attacks and sleep disturbance. Immediate housing crisis intervention initiated. Referred to emergency housing coordinator and addiction counseling. Safety planning completed. Emergency contact provided. Follow-up scheduled for tomorrow to check on housing applications.",
-                    "Concerning presentation today. Client reports job loss last week due to attendance issues related to untreated depression. Housing at risk - behind on rent for two months. Mentions increased alcohol use as coping mechanism. Children (ages 8, 12) staying with grandmother temporarily. Immediate referrals made to housing crisis worker, mental health urgent care, and family support services. Crisis plan developed. Daily check-ins arranged for this week."
-                ],
-                "experienced_worker": [
-                    "Crisis: eviction notice, increased substance use, mental health deteriorating. Housing coordinator involved. Addiction referral made. Daily follow-up this week.",
-                    "Job loss, housing risk, depression worsening. Kids with relative. Multiple referrals initiated. Crisis intervention active."
-                ],
-                "senior_worker": [
-                    "Housing crisis, substance escalation. Emergency interventions in place. Intensive support required.",
-                    "Multiple system failures. Crisis response activated. Coordinate all services urgently."
-                ]
-            },
-            4: {  # Crisis
-                "new_worker": [
-                    "URGENT: Client presented in acute mental health crisis. Reports active suicidal ideation with plan. Has not slept in 3 days, appears manic with rapid speech and paranoid thoughts. Homeless for past week after being asked to leave friend's residence. No current income or food. Emergency psychiatric assessment completed - client agreed to voluntary admission. Hospital transportation arranged. Personal belongings secured. Emergency contact (sister) notified. Crisis worker will coordinate discharge planning. Immediate follow-up required upon release.",
-                    "CRISIS INTERVENTION: Client found shelter in emergency department after overdose last night. Conscious and alert but requires intensive support. Reports intentional overdose following eviction and loss of custody of children. Severe depression with psychotic features noted. Admitted voluntarily to psychiatric unit. Addiction counselor involved. Child welfare worker coordinating with family. Emergency housing application submitted. Will visit client in hospital tomorrow."
-                ],
-                "experienced_worker": [
-                    "CRISIS: Suicidal ideation with plan. Voluntary psychiatric admission arranged. Homeless. Sister notified. Discharge planning critical.",
-                    "Overdose - intentional. Psych admission. Child custody lost. Multiple services coordinating. Hospital visit scheduled."
-                ],
-                "senior_worker": [
-                    "Psychiatric emergency. Admission secured. Complex discharge planning needed.",
-                    "Overdose crisis. System coordination essential. High-risk client."
-                ]
-            }
+    def _load_population_spec(self, spec_path: str, cache_dir: str = None, use_cache: bool = True):
+        """Set the population parameters from a YAML spec, plus their compiled sampling tables.
+
+        The parameters (age_distribution, risk_factors, archetypes,
+        note_templates, ...) become attributes of the generator; compiled
+        tables come from the on-disk cache when this spec and code were
+        compiled before (see population_spec.load_compiled_spec).
+        """
+        def compile_tables(parameters: Dict) -> Dict:
+            self.__dict__.update(parameters)
+            return self._compile_sampling_tables()
+        
+        parameters, tables, spec_sha256 = load_compiled_spec(
+            spec_path, compile_tables, cache_dir=cache_dir, use_cache=use_cache, code_files=CODE_FILES
+        )
+        self.__dict__.update(parameters)
+        self.__dict__.update(tables)
+        self.spec_info = {"file": os.path.basename(spec_path), "sha256": spec_sha256}
+
+    def _compile_sampling_tables(self) -> Dict:
+        """Build every lookup table the samplers need from the current parameters."""
+        tables = {}
+        
+        # Scenario rules compiled into single-pass matchers
+        tables["scenario_rewriter"] = self.scenario_rewriter = ScenarioRewriter(
+            self.scenario_rules, list(self.scenario_rates)
+        )
+        
+        # Every reachable note, rendered once: clients only carry a variant id
+        tables["note_variants"], tables["_note_variant_lookup"] = self._compile_note_variants()
+        
+        # Bitmask of the risk factors each template mentions
+        tables["_template_risk_masks"] = self._compile_template_risk_masks()
+        
+        # Gaussian copula for correlated risk factors
+        tables["_risk_cholesky_factor"] = self._risk_cholesky()
+        tables["_risk_thresholds"] = np.array(
+            [NormalDist().inv_cdf(1 - p) for p in self.risk_factors.values()], dtype=np.float32
+        )
+        
+        # Weighted categoricals
+        tables["_gender_table"] = CategoricalTable(self.gender_distribution)
+        tables["_complexity_table"] = CategoricalTable(self.complexity_distribution)
+        tables["_style_table"] = CategoricalTable(self.writer_styles)
+        
+        # Archetype lookup tables (one row per archetype)
+        archetype_values = list(self.archetypes.values())
+        tables["_archetype_ids"] = np.array(list(self.archetypes), dtype=object)
+        tables["_archetype_age_min"] = np.array([a["age_range"][0] for a in archetype_values])
+        tables["_archetype_age_max"] = np.array([a["age_range"][1] for a in archetype_values])
+        tables["_archetype_complexity"] = np.array([a["complexity"] for a in archetype_values])
+        weights = {name: a["weight"] for name, a in self.archetypes.items()}
+        tables["_archetype_table"] = CategoricalTable(weights) if len(set(weights.values())) > 1 else None
+        
+        # Quota allocation: share of clients per (archetype, complexity level)
+        # stratum, fitted to the archetype weights and the complexity distribution
+        tables["_complexity_levels"] = self._complexity_levels = np.array(sorted(self.complexity_distribution))
+        tables["_stratum_weights"] = archetype_complexity_weights(self.archetypes, self.complexity_distribution)
+        
+        # Category arrays shared by every ClientColumns block
+        categories = self._export_categories()
+        first_names = list(dict.fromkeys(name for names in self.first_names.values() for name in names))
+        last_names = list(dict.fromkeys(self.last_names))
+        tables["_client_categories"] = {
+            "first_name": np.array(first_names, dtype=object),
+            "last_name": np.array(last_names, dtype=object),
+            **{name: np.array(values, dtype=object) for name, values in categories.items() if name != "complexity_level"}
         }
+        tables["_archetype_location_codes"] = np.array(
+            [categories["location"].index(a["location"]) for a in archetype_values], dtype=code_dtype(len(categories["location"]))
+        )
+        
+        # Name pools: one padded row of first-name codes per gender code, and
+        # the last-name code of every pool entry (hash lookups, so pools loaded
+        # from files can hold hundreds of thousands of names)
+        genders = list(self.gender_distribution)
+        pool_sizes = np.array([len(self.first_names[g]) for g in genders])
+        first_name_index = pd.Index(first_names)
+        first_name_codes = np.full((len(genders), pool_sizes.max()), -1, dtype=code_dtype(len(first_names)))
+        for code, g in enumerate(genders):
+            first_name_codes[code, :pool_sizes[code]] = first_name_index.get_indexer(self.first_names[g])
+        tables["_first_name_pool_sizes"] = pool_sizes
+        tables["_first_name_codes"] = first_name_codes
+        tables["_last_name_codes"] = pd.Index(last_names).get_indexer(self.last_names).astype(code_dtype(len(last_names)))
+        
+        return tables
+
+    def allocate_strata(self, target_count: int, start: int = 0) -> np.ndarray:
+        """Exact client counts per (archetype, complexity level) stratum for target_count clients.
+
+        Level totals are the largest-remainder split of target_count over
+        complexity_distribution; each level's total is then split across
+        archetypes by the fitted stratum weights. For a shard starting at
+        client `start`, the level totals are the split of start + target_count
+        minus that of start, so consecutive shards add up to the split of the
+        whole run (unless a shard is too small to take its share).
+        """
+        weights = self._stratum_weights
+        shares = weights.sum(axis=0)
+        level_counts = apportion(start + target_count, shares) - apportion(start, shares)
+        if level_counts.min() < 0:
+            level_counts = apportion(target_count, shares)
+        strata = np.zeros(weights.shape, dtype=np.int64)
+        for j, count in enumerate(level_counts):
+            strata[:, j] = apportion(count, weights[:, j])
+        return strata
+
+    def _allocate_complexity(self, risk_burden: np.ndarray, rng: np.random.Generator,
+                             start: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """Archetype codes and complexity levels that fill the stratum quotas for len(risk_burden) clients.
+
+        Archetypes are shuffled into place; within an archetype its levels go,
+        lowest first, to clients in increasing order of risk burden (ties at
+        random), so risk still drives complexity without breaking the quotas.
+        """
+        n = len(risk_burden)
+        strata = self.allocate_strata(n, start=start)
+        archetype_codes = rng.permutation(np.repeat(np.arange(len(strata)), strata.sum(axis=1)))
+        order = np.lexsort((rng.random(n), risk_burden, archetype_codes))
+        complexity_levels = np.empty(n, dtype=np.int64)
+        complexity_levels[order] = np.repeat(np.tile(self._complexity_levels, len(strata)), strata.ravel())
+        return archetype_codes, complexity_levels
 
     def generate_demographics(self, target_count: int) -> List[Dict]:
         """Generate demographic profiles for target number of clients."""
         clients = []
         
+        # Correlated risk-factor profiles for every client, drawn up front
+        risk_masks = self.sample_risk_factors(target_count)
+        
+        # Quota allocation fixes every client's archetype and complexity up front
+        quota = self.complexity_allocation == "quota"
+        person_oids = self.oid_format(0, target_count)
+        if quota:
+            archetype_codes, complexity_levels = self._allocate_complexity(POPCOUNT_UINT8[risk_masks], self.rng)
+        
         for i in range(target_count):
             # Select archetype first to guide other choices
-            archetype_id = random.choice(list(self.archetypes.keys()))
+            if quota:
+                archetype_id = self._archetype_ids[archetype_codes[i]]
+            elif self._archetype_table is None:
+                archetype_id = self.random.choice(self._archetype_ids)
+            else:
+                archetype_id = self._archetype_table.choice(self.random)
             archetype = self.archetypes[archetype_id]
             
             # Generate age within archetype range
             age_min, age_max = archetype["age_range"]
-            age = random.randint(age_min, age_max)
+            age = self.random.randint(age_min, age_max)
             
             # Generate other demographics
-            gender = random.choices(
-                list(self.gender_distribution.keys()),
-                weights=list(self.gender_distribution.values())
-            )[0]
+            gender = self._gender_table.choice(self.random)
             
             location = archetype["location"]  # Use archetype location
-            complexity_level = archetype["complexity"]
-            
-            # Adjust complexity based on distribution requirements
-            if random.random() < 0.1:  # 10% chance to adjust complexity
-                complexity_level = random.choices(
-                    list(self.complexity_distribution.keys()),
-                    weights=list(self.complexity_distribution.values())
-                )[0]
+            if quota:
+                complexity_level = int(complexity_levels[i])
+            else:
+                complexity_level = archetype["complexity"]
+                
+                # Adjust complexity based on distribution requirements
+                if self.random.random() < 0.1:  # 10% chance to adjust complexity
+                    complexity_level = self._complexity_table.choice(self.random)
+                
+                # Shift complexity by risk burden
+                complexity_level = int(self._risk_adjusted_complexity(complexity_level, risk_masks[i]))
             
             # Generate names
-            first_name = random.choice(self.first_names[gender])
-            last_name = random.choice(self.last_names)
+            first_name = self.random.choice(self.first_names[gender])
+            last_name = self.random.choice(self.last_names)
             
             # Generate writer style
-            writer_style = random.choices(
-                list(self.writer_styles.keys()),
-                weights=list(self.writer_styles.values())
-            )[0]
+            writer_style = self._style_table.choice(self.random)
             
             clients.append({
-                "person_oid": f"CN-{i+1:03d}",
+                "person_oid": person_oids[i],
                 "first_name": first_name,
                 "last_name": last_name,
                 "gender": gender,
@@ -193,54 +713,198 @@ class SyntheticCaseNoteGenerator:
                 "complexity_level": complexity_level,
                 "archetype_id": archetype_id,
                 "writer_style": writer_style,
+                "risk_factors": int(risk_masks[i]),
                 "embedded_scenarios": []
             })
         
         return clients
 
-    def generate_embedded_scenarios(self, clients: List[Dict]) -> List[Dict]:
-        """Add embedded validation scenarios to specific clients."""
-        
-        # Calculate target numbers based on percentages
-        total_clients = len(clients)
-        housing_crisis_count = int(total_clients * 0.15)  # 15%
-        mental_health_count = int(total_clients * 0.08)   # 8%
-        success_count = int(total_clients * 0.12)         # 12%
-        
-        # Randomly select clients for each scenario
-        available_indices = list(range(total_clients))
+    def generate_demographics_batch(self, target_count: int, rng: np.random.Generator = None,
+                                    start_index: int = 0) -> pd.DataFrame:
+        """Generate demographic profiles as whole columns (batch mode for large runs).
+
+        Draws the same fields with the same marginal distributions as
+        generate_demographics (including the risk_factors bitmask from
+        sample_risk_factors), but samples every column as a NumPy array
+        instead of building one client at a time. `start_index` offsets the
+        person_oid numbering so shards can be generated independently.
+        Returns the DataFrame view of generate_demographics_columns: text
+        fields are Categoricals and embedded_scenarios is a uint8 bitmask.
+        """
+        return self.generate_demographics_columns(target_count, rng=rng, start_index=start_index).to_frame()
+
+    def generate_demographics_columns(self, target_count: int, rng: np.random.Generator = None,
+                                      start_index: int = 0) -> ClientColumns:
+        """Generate demographic profiles as compact ClientColumns (see generate_demographics_batch)."""
+        rng = rng or self.rng
+        n = target_count
+
+        if self.complexity_allocation == "quota":
+            # Correlated risk factors, then archetypes and complexity filling
+            # the exact stratum quotas (higher levels for higher risk burden)
+            risk_masks = self.sample_risk_factors(n, rng=rng)
+            archetype_codes, complexity_levels = self._allocate_complexity(
+                POPCOUNT_UINT8[risk_masks], rng, start=start_index
+            )
+        else:
+            # Select archetype first to guide other choices (by weight, as in the scalar path)
+            if self._archetype_table is None:
+                archetype_codes = rng.integers(0, len(self._archetype_ids), size=n)
+            else:
+                archetype_codes = self._archetype_table.sample_codes(rng, n)
+
+        # Age within archetype range (inclusive, like random.randint)
+        ages = rng.integers(self._archetype_age_min[archetype_codes], self._archetype_age_max[archetype_codes] + 1)
+
+        # Gender
+        gender_codes = self._gender_table.sample_codes(rng, n)
+
+        if self.complexity_allocation != "quota":
+            # Complexity from archetype, with 10% drawn from the target distribution
+            complexity_levels = self._archetype_complexity[archetype_codes]
+            override = rng.random(n) < 0.1
+            complexity_levels[override] = self._complexity_table.sample(rng, int(override.sum()))
+            
+            # Correlated risk factors, which also shift complexity by risk burden
+            risk_masks = self.sample_risk_factors(n, rng=rng)
+            complexity_levels = self._risk_adjusted_complexity(complexity_levels, risk_masks)
+
+        # Names: first names are drawn from the pool matching each client's gender
+        first_name_index = (rng.random(n) * self._first_name_pool_sizes[gender_codes]).astype(np.int64)
+        last_name_index = rng.integers(0, len(self._last_name_codes), size=n)
+
+        # Writer style
+        style_codes = self._style_table.sample_codes(rng, n)
+
+        categories = self._client_categories
+        return ClientColumns({
+            "first_name": self._first_name_codes[gender_codes, first_name_index],
+            "last_name": self._last_name_codes[last_name_index],
+            "gender": gender_codes.astype(code_dtype(len(categories["gender"]))),
+            "age": ages.astype(np.int8),
+            "location": self._archetype_location_codes[archetype_codes],
+            "complexity_level": complexity_levels.astype(np.int8),
+            "archetype_id": archetype_codes.astype(code_dtype(len(categories["archetype_id"]))),
+            "writer_style": style_codes.astype(code_dtype(len(categories["writer_style"]))),
+            "risk_factors": risk_masks,
+            "embedded_scenarios": np.zeros(n, dtype=np.uint8)
+        }, categories, start_index=start_index, oid_format=self.oid_format)
+
+    def sample_risk_factors(self, target_count: int, rng: np.random.Generator = None) -> np.ndarray:
+        """Sample correlated binary risk-factor profiles for all clients at once.
+
+        Latent normals with the risk_correlations matrix are thresholded at
+        each factor's prevalence (a Gaussian copula), so every factor keeps
+        its configured marginal rate. Returns a uint8 bitmask per client,
+        bit i = i-th key of risk_factors.
+        """
+        rng = rng or self.rng
+        latent = rng.standard_normal((target_count, len(self.risk_factors)), dtype=np.float32) @ self._risk_cholesky_factor.T
+        return np.packbits(latent > self._risk_thresholds, axis=1, bitorder="little")[:, 0]
+
+    def _risk_adjusted_complexity(self, complexity, risk_masks):
+        """Move complexity one level up for a high risk burden and one level down for none."""
+        levels = list(self.complexity_distribution)
+        burden = POPCOUNT_UINT8[risk_masks]
+        rules = self.risk_complexity_rules
+        complexity = np.where(burden >= rules["escalate_at"], np.minimum(complexity + 1, max(levels)), complexity)
+        return np.where(burden <= rules["deescalate_at"], np.maximum(complexity - 1, min(levels)), complexity)
+
+    def _risk_cholesky(self) -> np.ndarray:
+        """Cholesky factor of the risk correlation matrix, repaired to positive definite if needed."""
+        factors = list(self.risk_factors)
+        correlation = np.eye(len(factors))
+        for (a, b), rho in self.risk_correlations.items():
+            i, j = factors.index(a), factors.index(b)
+            correlation[i, j] = correlation[j, i] = rho
         
-        # Housing crisis scenarios (prefer higher complexity)
-        housing_candidates = [i for i, c in enumerate(clients) if c["complexity_level"] >= 3]
-        housing_indices = random.sample(
-            housing_candidates if len(housing_candidates) >= housing_crisis_count else available_indices,
-            housing_crisis_count
+        try:
+            return np.linalg.cholesky(correlation).astype(np.float32)
+        except np.linalg.LinAlgError:
+            # Clip negative eigenvalues and rescale back to unit diagonal
+            eigenvalues, eigenvectors = np.linalg.eigh(correlation)
+            repaired = eigenvectors @ np.diag(np.clip(eigenvalues, 1e-6, None)) @ eigenvectors.T
+            scale = np.sqrt(np.diag(repaired))
+            return np.linalg.cholesky(repaired / np.outer(scale, scale)).astype(np.float32)
+
+    def generate_embedded_scenarios(self, clients: Union[List[Dict], pd.DataFrame, ClientColumns],
+                                    counts: Dict[str, int] = None,
+                                    rng: np.random.Generator = None) -> Union[List[Dict], pd.DataFrame, ClientColumns]:
+        """Add embedded validation scenarios to specific clients.
+
+        Accepts the list of client dicts from generate_demographics, the
+        ClientColumns from generate_demographics_columns, or a DataFrame whose
+        embedded_scenarios holds lists or bitmasks. `counts` overrides the
+        per-scenario quotas derived from scenario_rates (used for shards).
+        """
+        bitmask_column = isinstance(clients, ClientColumns) or (
+            isinstance(clients, pd.DataFrame) and pd.api.types.is_integer_dtype(clients["embedded_scenarios"].dtype)
         )
+        if bitmask_column:
+            # Set scenario bits instead of appending to per-client lists
+            complexity = np.asarray(clients["complexity_level"])
+            masks = self._scenario_bitmask(clients["embedded_scenarios"]).copy()
+            scenarios = list(self.scenario_rates)
+            for scenario, indices in self._select_scenario_indices(complexity, counts, rng).items():
+                masks[indices] |= 1 << scenarios.index(scenario)
+            clients["embedded_scenarios"] = masks
+            return clients
         
-        for idx in housing_indices:
-            clients[idx]["embedded_scenarios"].append("housing_crisis")
+        if isinstance(clients, pd.DataFrame):
+            complexity = clients["complexity_level"].to_numpy()
+            scenario_lists = clients["embedded_scenarios"].to_numpy()
+        else:
+            complexity = np.fromiter((c["complexity_level"] for c in clients), dtype=np.int64, count=len(clients))
+            scenario_lists = [c["embedded_scenarios"] for c in clients]
         
-        # Mental health deterioration (any complexity)
-        remaining_indices = [i for i in available_indices if i not in housing_indices]
-        mental_health_indices = random.sample(remaining_indices, min(mental_health_count, len(remaining_indices)))
+        for scenario, indices in self._select_scenario_indices(complexity, counts, rng).items():
+            for idx in indices:
+                scenario_lists[idx].append(scenario)
         
-        for idx in mental_health_indices:
-            clients[idx]["embedded_scenarios"].append("mental_health_deterioration")
+        return clients
+
+    def _select_scenario_indices(self, complexity: np.ndarray, counts: Dict[str, int] = None,
+                                 rng: np.random.Generator = None) -> Dict[str, np.ndarray]:
+        """Choose mutually exclusive client indices for each embedded scenario.
+
+        Selection runs on boolean masks, so it is linear in the number of
+        clients. When a preferred candidate pool is smaller than its quota,
+        every preferred candidate is used and the remainder is filled from
+        the other clients still available.
+        """
+        total_clients = len(complexity)
+        rng = rng or self.rng
+        if counts is None:
+            counts = {scenario: int(total_clients * rate) for scenario, rate in self.scenario_rates.items()}
         
-        # Success scenarios (prefer lower complexity)
-        success_candidates = [i for i in available_indices 
-                            if i not in housing_indices and i not in mental_health_indices 
-                            and clients[i]["complexity_level"] <= 2]
-        success_indices = random.sample(
-            success_candidates if len(success_candidates) >= success_count else 
-            [i for i in available_indices if i not in housing_indices and i not in mental_health_indices],
-            min(success_count, len(available_indices) - len(housing_indices) - len(mental_health_indices))
-        )
+        # Preferred candidates: clients within the scenario's preferred
+        # complexity range (scenario_complexity in the spec; any by default)
+        available = np.ones(total_clients, dtype=bool)
+        selected = {}
+        for scenario in self.scenario_rates:
+            bounds = self.scenario_complexity.get(scenario, {})
+            preferred = np.ones(total_clients, dtype=bool)
+            if "min_complexity" in bounds:
+                preferred &= complexity >= bounds["min_complexity"]
+            if "max_complexity" in bounds:
+                preferred &= complexity <= bounds["max_complexity"]
+            indices = self._sample_with_preference(available, preferred, counts[scenario], rng)
+            available[indices] = False
+            selected[scenario] = indices
         
-        for idx in success_indices:
-            clients[idx]["embedded_scenarios"].append("successful_service_connection")
+        return selected
+
+    @staticmethod
+    def _sample_with_preference(available: np.ndarray, preferred: np.ndarray, count: int,
+                                rng: np.random.Generator) -> np.ndarray:
+        """Sample up to `count` available indices, drawing from the preferred pool first."""
+        preferred_pool = np.flatnonzero(available & preferred)
+        if len(preferred_pool) >= count:
+            return rng.choice(preferred_pool, size=count, replace=False)
         
-        return clients
+        fallback_pool = np.flatnonzero(available & ~preferred)
+        fill = rng.choice(fallback_pool, size=min(count - len(preferred_pool), len(fallback_pool)), replace=False)
+        return np.concatenate([preferred_pool, fill])
 
     def generate_case_note(self, client: Dict) -> str:
         """Generate a case note for a specific client."""
@@ -248,119 +912,863 @@ class SyntheticCaseNoteGenerator:
         writer_style = client["writer_style"]
         scenarios = client["embedded_scenarios"]
         
-        # Get base template
-        base_note = random.choice(self.note_templates[complexity][writer_style])
+        # Get base template (favouring templates that mention the client's risk factors)
+        template_index = int(self._draw_template_indices(
+            np.array([list(self.note_templates).index(complexity)]),
+            np.array([list(self.writer_styles).index(writer_style)]),
+            np.array([client.get("risk_factors", 0)], dtype=np.uint8),
+            np.array([self.random.random()])
+        )[0])
         
-        # Modify based on embedded scenarios
-        if "housing_crisis" in scenarios:
-            if complexity < 3:
-                base_note = base_note.replace("stable housing", "precarious housing situation")
-                base_note += " Housing stability concerns noted - exploring emergency options."
-            else:
-                base_note = base_note.replace("Housing", "URGENT HOUSING CRISIS:")
+        return self.note_variants[self.note_variant_id(complexity, writer_style, template_index, scenarios)]
+
+    def note_variant_id(self, complexity: int, writer_style: str, template_index: int, scenarios: List[str]) -> int:
+        """Return the row of note_variants for one (complexity, style, template, scenarios) key."""
+        complexity_code = list(self.note_templates).index(complexity)
+        style_code = list(self.writer_styles).index(writer_style)
+        scenario_mask = int(self._scenario_bitmask([scenarios])[0])
+        return int(self._note_variant_lookup[complexity_code, style_code, template_index, scenario_mask])
+
+    def _draw_template_indices(self, complexity_codes: np.ndarray, style_codes: np.ndarray,
+                               risk_masks: np.ndarray, u: np.ndarray) -> np.ndarray:
+        """Pick a template per note, favouring templates that mention the client's risk factors.
+
+        Each template in a client's (complexity, style) cell gets weight
+        1 + the number of the client's risk factors it mentions; `u` holds one
+        uniform draw per note. All arguments broadcast against each other.
+        """
+        template_risk = self._template_risk_masks[complexity_codes, style_codes]
+        valid = self._note_variant_lookup[complexity_codes, style_codes, :, 0] >= 0
+        weights = np.where(valid, 1 + POPCOUNT_UINT8[template_risk & np.asarray(risk_masks)[..., None]], 0)
+        cumulative = np.cumsum(weights, axis=-1)
+        return (u[..., None] * cumulative[..., -1:] >= cumulative).sum(axis=-1)
+
+    def _compile_template_risk_masks(self) -> np.ndarray:
+        """Bitmask of the risk factors each note template mentions, indexed like _note_variant_lookup."""
+        levels = list(self.note_templates)
+        styles = list(self.writer_styles)
+        max_templates = max(len(t) for by_style in self.note_templates.values() for t in by_style.values())
         
-        if "mental_health_deterioration" in scenarios:
-            base_note = base_note.replace("stable", "deteriorating")
-            base_note += " Mental health symptoms worsening - increased monitoring required."
+        masks = np.zeros((len(levels), len(styles), max_templates), dtype=np.uint8)
+        for complexity_code, level in enumerate(levels):
+            for style_code, style in enumerate(styles):
+                for template_index, template in enumerate(self.note_templates[level][style]):
+                    text = template.lower()
+                    for bit, factor in enumerate(self.risk_factors):
+                        if any(keyword in text for keyword in self.risk_keywords.get(factor, ())):
+                            masks[complexity_code, style_code, template_index] |= 1 << bit
+        return masks
+
+    def _compile_note_variants(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Render every (complexity, writer style, template, scenario combination) note once.
+
+        Returns the interned table of distinct note strings and a dense lookup
+        array indexed by [complexity code, style code, template index,
+        scenario bitmask] giving the row in that table (-1 where a
+        complexity/style cell has fewer templates).
+        """
+        levels = list(self.note_templates)
+        styles = list(self.writer_styles)
+        scenarios = list(self.scenario_rates)
+        max_templates = max(len(t) for by_style in self.note_templates.values() for t in by_style.values())
         
-        if "successful_service_connection" in scenarios:
-            base_note += " Positive progress noted with recent service connections. Client showing improved engagement."
+        # One row per reachable cell, rewritten as a single column
+        cells = [
+            (complexity_code, style_code, template_index, scenario_mask)
+            for complexity_code, level in enumerate(levels)
+            for style_code, style in enumerate(styles)
+            for template_index in range(len(self.note_templates[level][style]))
+            for scenario_mask in range(1 << len(scenarios))
+        ]
+        complexity_codes, style_codes, template_indices, scenario_masks = np.array(cells).T
+        notes = self.scenario_rewriter.rewrite_column(
+            [self.note_templates[levels[c]][styles[s]][t] for c, s, t in zip(complexity_codes, style_codes, template_indices)],
+            np.array(levels)[complexity_codes],
+            scenario_masks
+        )
         
-        return base_note
+        codes, variants = pd.factorize(notes)
+        lookup = np.full((len(levels), len(styles), max_templates, 1 << len(scenarios)), -1, dtype=np.int32)
+        lookup[complexity_codes, style_codes, template_indices, scenario_masks] = codes
+        return np.asarray(variants, dtype=object), lookup
 
-    def generate_synthetic_dataset(self, target_count: int = 500) -> Tuple[pd.DataFrame, Dict]:
-        """Generate complete synthetic dataset with metadata."""
+    def _render_case_note(self, complexity: int, writer_style: str, template_index: int, scenarios: List[str]) -> str:
+        """Render one note template with the edits for its embedded scenarios (see ScenarioRewriter)."""
+        base_note = self.note_templates[complexity][writer_style][template_index]
+        return self.scenario_rewriter.rewrite(base_note, complexity, self._scenario_bitmask([scenarios])[0])
+
+    def generate_case_notes_batch(self, clients: pd.DataFrame, rng: np.random.Generator = None) -> pd.Categorical:
+        """Generate case notes for a batch DataFrame, drawing template choices as one array.
+
+        Notes are looked up in the precompiled note_variants table and returned
+        as a Categorical over it: each client stores only a small integer code,
+        and strings are materialized on access or export.
+        """
+        rng = rng or self.rng
+        complexity_codes = pd.Categorical(clients["complexity_level"], categories=list(self.note_templates)).codes
+        style_codes = pd.Categorical(clients["writer_style"], categories=list(self.writer_styles)).codes
+        scenario_masks = self._scenario_bitmask(clients["embedded_scenarios"])
         
-        print(f"Generating {target_count} synthetic case notes...")
+        risk_masks = clients["risk_factors"].to_numpy(dtype=np.uint8)
+        template_indices = self._draw_template_indices(complexity_codes, style_codes, risk_masks, rng.random(len(clients)))
+        
+        variant_ids = self._note_variant_lookup[complexity_codes, style_codes, template_indices, scenario_masks]
+        return pd.Categorical.from_codes(variant_ids, categories=self.note_variants)
+
+    def scenario_quota(self, start: int, count: int) -> Dict[str, int]:
+        """Clients start .. start + count - 1's share of each global scenario quota.
+
+        Splitting the quotas this way makes the totals over consecutive
+        shards match an unsharded run of the same number of clients.
+        """
+        stop = start + count
+        return {scenario: int(stop * rate) - int(start * rate) for scenario, rate in self.scenario_rates.items()}
+
+    def _generate_shard(self, shard_index: int, start: int, count: int, total_count: int,
+                        with_metrics: bool = False) -> pd.DataFrame:
+        """Generate one shard of clients with notes from its own child RNG stream.
+
+        The stream is derived from the master seed and the shard index only, so
+        a shard comes out the same whichever process generates it. With
+        `with_metrics` the shard's DatasetMetrics (including note diversity)
+        are computed alongside, in the worker, and kept in attrs["metrics"].
+        """
+        rng = np.random.default_rng(np.random.SeedSequence(self.seed, spawn_key=(shard_index,)))
+        
+        # Stage records are collected per shard (possibly in a worker process)
+        # and handed to self.profiler when the shard is consumed
+        profiler = StageProfiler(self.profiler.track_memory) if self.profiler else None
+        
+        with profile_stage(profiler, "demographics", count):
+            clients = self.generate_demographics_columns(count, rng=rng, start_index=start)
         
-        # Generate demographics
-        clients = self.generate_demographics(target_count)
+        with profile_stage(profiler, "scenarios", count):
+            clients = self.generate_embedded_scenarios(
+                clients, counts=self.scenario_quota(start, count), rng=rng
+            ).to_frame()
         
-        # Add embedded scenarios
-        clients = self.generate_embedded_scenarios(clients)
+        with profile_stage(profiler, "notes", count):
+            clients["case_note"] = self.generate_case_notes_batch(clients, rng=rng)
         
-        # Generate case notes
-        for client in clients:
-            client["case_note"] = self.generate_case_note(client)
+        if with_metrics:
+            with profile_stage(profiler, "metrics", count):
+                clients.attrs["metrics"] = DatasetMetrics.from_frame(
+                    clients, list(self.scenario_rates), list(self.risk_factors)
+                )
         
-        # Create DataFrame
-        df = pd.DataFrame(clients)
+        if profiler:
+            clients.attrs["stage_profile"] = profiler.records
+        return clients
+
+    def iter_synthetic_chunks(self, target_count: int, chunk_size: int = DEFAULT_SHARD_SIZE,
+                              workers: int = 1, start: int = 0, first_shard: int = 0) -> Iterator[pd.DataFrame]:
+        """Yield the batch-mode dataset as consecutive chunks of `chunk_size` clients with notes.
+
+        Each chunk is one shard, so concatenating the chunks gives exactly the
+        DataFrame that generate_synthetic_dataset(batch=True) returns for the
+        same seed and shard size. With `workers > 1` only a few chunks are in
+        flight at a time, so memory stays flat regardless of target_count.
+        `start` and `first_shard` skip clients (and shards) already generated,
+        continuing person_oid numbering and the per-shard RNG streams. Each
+        chunk's DatasetMetrics are computed by the worker that generated it
+        and kept in chunk.attrs["metrics"].
+        """
+        plan = shard_plan(target_count, chunk_size, start=start, first_shard=first_shard)
+        for chunk in iter_ordered(partial(self._generate_shard, with_metrics=True), plan, workers):
+            records = chunk.attrs.pop("stage_profile", None)
+            if records and self.profiler:
+                self.profiler.add(records)
+            yield chunk
+    
+    def _stage(self, name: str, rows: int = None):
+        """Profile a stage with self.profiler (a no-op context when profiling is off)."""
+        return profile_stage(self.profiler, name, rows)
+
+    def run_key_fields(self, **options) -> Dict:
+        """What identifies a run: population spec and name files, generator code, seed and the given options."""
+        return {
+            "spec": self.spec_info["sha256"], "name_files": self.name_files,
+            "code": source_digest(CODE_FILES), "seed": self.seed, **options
+        }
+
+    def run_key(self, **options) -> str:
+        """Hash of run_key_fields()."""
+        return hashlib.sha256(json.dumps(self.run_key_fields(**options), sort_keys=True).encode()).hexdigest()
+
+    def _open_checkpoint(self, directory: str, target_count: int, append: bool = False, resume: bool = True,
+                         **options) -> Tuple[GenerationCheckpoint, int]:
+        """Load the checkpoint for this run (or start an empty one) and return it with the total target.
+
+        With `append`, target_count counts the clients to add after the
+        checkpointed ones, and a checkpoint must exist. A checkpoint of a
+        different run raises ValueError; `resume=False` discards whatever
+        the directory holds and starts over.
+        """
+        fields = self.run_key_fields(**options)
+        checkpoint = GenerationCheckpoint(directory, self.run_key(**options), fields)
+        if not resume:
+            if append:
+                raise ValueError("append resumes the checkpointed dataset; it cannot be combined with resume=False")
+            checkpoint.reset()
+            return checkpoint, target_count
+        state = checkpoint.load()
+        if state is None:
+            if append:
+                raise ValueError(f"No checkpoint for these parameters in {directory} to append to")
+            checkpoint.reset()
+            return checkpoint, target_count
         
-        # Generate metadata
-        metadata = {
+        if append:
+            target_count += state["rows"]
+        elif state["rows"] > target_count:
+            raise ValueError(
+                f"Checkpoint in {directory} already holds {state['rows']} clients, more than the {target_count} requested"
+            )
+        if state["rows"] < target_count:
+            print(f"↩️  Resuming after {state['rows']} checkpointed clients ({state['shards']} shards)")
+        return checkpoint, target_count
+
+    def _generate_sharded(self, target_count: int, workers: int, shard_size: int,
+                          checkpoint: GenerationCheckpoint = None,
+                          checkpoint_every: int = 1) -> Tuple[pd.DataFrame, DatasetMetrics]:
+        """Generate clients shard by shard, optionally on a process pool, with their merged metrics.
+
+        With a `checkpoint`, the shards generated since the last save are
+        written to it every `checkpoint_every` shards, and generation starts
+        after the shards it already holds.
+        """
+        metrics = DatasetMetrics(list(self.scenario_rates), list(self.risk_factors))
+        shards = []
+        start = first_shard = 0
+        if checkpoint is not None and checkpoint.state["metrics"]:
+            with self._stage("checkpoint_restore", checkpoint.state["rows"]):
+                shards = checkpoint.read_parts()
+                metrics = DatasetMetrics.from_dict(checkpoint.state["metrics"])
+            start, first_shard = checkpoint.state["rows"], checkpoint.state["shards"]
+        
+        pending = []
+        
+        def save_checkpoint(shard_count: int):
+            with self._stage("checkpoint", sum(map(len, pending))):
+                checkpoint.write_part(pd.concat(pending, ignore_index=True))
+                checkpoint.save(shard_count, metrics.total, metrics.to_dict())
+            pending.clear()
+        
+        chunks = self.iter_synthetic_chunks(
+            target_count, chunk_size=shard_size, workers=workers, start=start, first_shard=first_shard
+        )
+        for shard_count, shard in enumerate(chunks, first_shard + 1):
+            with self._stage("metrics_merge", len(shard)):
+                metrics.merge(shard.attrs.pop("metrics"))
+            shards.append(shard)
+            if checkpoint is not None:
+                pending.append(shard)
+                if len(pending) >= checkpoint_every:
+                    save_checkpoint(shard_count)
+        if pending:
+            save_checkpoint(shard_count)
+        
+        if not shards:
+            return self._generate_shard(0, 0, 0, 0), metrics
+        return pd.concat(shards, ignore_index=True), metrics
+
+    def generate_synthetic_dataset(self, target_count: int = 500, batch: bool = False, workers: int = 1,
+                                   shard_size: int = DEFAULT_SHARD_SIZE, checkpoint_dir: str = None,
+                                   checkpoint_every: int = 1, append: bool = False,
+                                   resume: bool = True) -> Tuple[pd.DataFrame, Dict]:
+        """Generate complete synthetic dataset with metadata.
+
+        With `batch=True` (implied by `workers > 1`) clients are generated in
+        columnar shards of `shard_size`, each from its own RNG stream derived
+        from the master seed, and shards run on a pool of `workers` processes.
+        The result is identical for a given seed and shard size whatever the
+        worker count.
+
+        A `checkpoint_dir` (which implies batch mode) saves the generated
+        shards there every `checkpoint_every` shards. Rerunning with the same
+        seed, spec and shard size resumes after the last checkpoint, or just
+        reloads the clients when they are all checkpointed. A larger
+        target_count, or `append=True` with target_count as the number of
+        clients to add, extends the dataset with continuing person_oid
+        numbering. A checkpoint written with other parameters raises
+        ValueError unless `resume=False`, which discards it.
+        """
+        
+        checkpoint = None
+        if checkpoint_dir:
+            checkpoint, target_count = self._open_checkpoint(
+                checkpoint_dir, target_count, append, resume, mode="dataset", shard_size=shard_size
+            )
+        elif append:
+            raise ValueError("append needs a checkpoint_dir holding the dataset to extend")
+        
+        print(f"Generating {target_count} synthetic case notes...")
+        
+        if batch or workers > 1 or checkpoint is not None:
+            df, metrics = self._generate_sharded(target_count, workers, shard_size, checkpoint, checkpoint_every)
+        else:
+            # Generate demographics
+            with self._stage("demographics", target_count):
+                clients = self.generate_demographics(target_count)
+            
+            # Add embedded scenarios
+            with self._stage("scenarios", target_count):
+                clients = self.generate_embedded_scenarios(clients)
+            
+            # Generate case notes
+            with self._stage("notes", target_count):
+                for client in clients:
+                    client["case_note"] = self.generate_case_note(client)
+            
+            # Create DataFrame
+            with self._stage("metrics", target_count):
+                df = pd.DataFrame(clients)
+                metrics = DatasetMetrics.from_frame(df, list(self.scenario_rates), list(self.risk_factors))
+        
+        return df, self._build_metadata(metrics)
+
+    def _build_metadata(self, metrics: DatasetMetrics) -> Dict:
+        """Generate metadata from accumulated dataset metrics."""
+        return {
             "generation_date": datetime.utcnow().isoformat() + "Z",
             "dataset_name": "synthetic_case_notes",
-            "total_cases": len(df),
+            "total_cases": metrics.total,
             "generation_parameters": {
                 "target_population": "Alberta-like social services clients",
                 "age_focus": "18-64 primary",
                 "complexity_distribution": {
                     f"level_{k}": f"{int(v*100)}%" for k, v in self.complexity_distribution.items()
-                }
+                },
+                "complexity_allocation": self.complexity_allocation,
+                "identity": self._identity_metadata(),
+                "population_spec": self.spec_info
             },
             "validation_targets": {
-                "housing_crisis_indicators": f"{len(df[df['embedded_scenarios'].apply(lambda x: 'housing_crisis' in x)])} cases ({len(df[df['embedded_scenarios'].apply(lambda x: 'housing_crisis' in x)])/len(df)*100:.1f}%)",
-                "mental_health_deterioration": f"{len(df[df['embedded_scenarios'].apply(lambda x: 'mental_health_deterioration' in x)])} cases ({len(df[df['embedded_scenarios'].apply(lambda x: 'mental_health_deterioration' in x)])/len(df)*100:.1f}%)",
-                "successful_service_connections": f"{len(df[df['embedded_scenarios'].apply(lambda x: 'successful_service_connection' in x)])} cases ({len(df[df['embedded_scenarios'].apply(lambda x: 'successful_service_connection' in x)])/len(df)*100:.1f}%)"
+                scenario: metrics.scenario_summary(scenario) for scenario in self.scenario_rates
             },
             "quality_metrics": {
-                "average_age": float(df['age'].mean()),
-                "gender_distribution": df['gender'].value_counts(normalize=True).to_dict(),
-                "complexity_distribution": df['complexity_level'].value_counts(normalize=True).to_dict(),
-                "location_distribution": df['location'].value_counts(normalize=True).to_dict()
+                "average_age": float(metrics.average_age()),
+                "gender_distribution": metrics.proportions("gender"),
+                "complexity_distribution": metrics.proportions("complexity_level"),
+                "location_distribution": metrics.proportions("location"),
+                "risk_factor_prevalence": metrics.risk_factor_prevalence()
             },
+            "note_diversity": metrics.diversity.summary(),
+            **self._profile_metadata(),
             "export_timestamp": datetime.utcnow().isoformat() + "Z"
         }
-        
-        return df, metadata
+    
+    def _identity_metadata(self) -> Dict:
+        """person_oid scheme and name pool sizes (the oid_key is not recorded)."""
+        last_names = len(self.last_names)
+        return {
+            "oid_scheme": self.oid_format.scheme,
+            "oid_format": f"{self.oid_format.prefix}{'N' * self.oid_format.digits}",
+            "first_name_pool_sizes": {gender: len(names) for gender, names in self.first_names.items()},
+            "last_name_pool_size": last_names,
+            "name_combinations": sum(len(names) * last_names for names in self.first_names.values()),
+            **({"name_files": self.name_files} if self.name_files else {})
+        }
 
-    def export_data(self, df: pd.DataFrame, metadata: Dict, output_dir: str = "./output"):
-        """Export data in multiple formats."""
+    def _profile_metadata(self) -> Dict:
+        """The `generation_profile` metadata entry (per-stage totals so far), if profiling."""
+        if self.profiler is None:
+            return {}
+        return {"generation_profile": self.profiler.summary()}
+
+    def export_data(self, df: pd.DataFrame, metadata: Dict, output_dir: str = "./output",
+                    columnar: Tuple[str, ...] = (), json_lines: bool = False, json_encoder: str = "pandas",
+                    compression: Dict[str, str] = None, export_workers: int = 1, export_executor: str = "thread"):
+        """Export data in multiple formats.
+
+        `columnar` optionally adds Parquet and/or Arrow IPC ("feather") files,
+        see export_columnar. `json_lines` writes the compact JSON Lines file
+        instead of the JSON document with its metadata envelope, and
+        `json_encoder` picks the encoder for either (see iter_json_lines).
+
+        `compression` maps formats to codecs: "gzip" or "zstd" for csv, json
+        and jsonl (written as .gz / .zst files), and any Parquet or Arrow IPC
+        codec for parquet and feather. With `export_workers > 1` the formats
+        are encoded and written concurrently on a pool of threads or forked
+        processes (`export_executor`, see _run_writers). The bytes and seconds
+        of every output are recorded in metadata["export_report"]. A label
+        index over the uncompressed CSV / JSON Lines and the columnar files is
+        written alongside (see label_index.load_rows).
+        """
+        compression = dict(compression or {})
+        unknown = set(compression) - set(TEXT_FORMATS) - set(COLUMNAR_FORMATS)
+        if unknown:
+            raise ValueError(f"Compression given for unknown formats: {sorted(unknown)}")
+        for fmt in TEXT_FORMATS:
+            if compression.get(fmt) not in (None, *COMPRESSION_SUFFIXES):
+                raise ValueError(f"Unsupported {fmt} compression: {compression[fmt]!r} "
+                                 f"(choose from {', '.join(COMPRESSION_SUFFIXES)})")
         
         # Create output directory
         os.makedirs(output_dir, exist_ok=True)
         
-        # Prepare DataFrame for export (flatten embedded_scenarios)
-        export_df = df.copy()
-        export_df['embedded_scenarios'] = export_df['embedded_scenarios'].apply(
-            lambda x: ','.join(x) if x else ''
-        )
+        # Prepare DataFrame for export (flatten embedded_scenarios); every
+        # writer reads this one frame (and the one Arrow table)
+        with self._stage("export_prepare", len(df)):
+            export_df = self._prepare_export_frame(df)
+        if columnar:
+            with self._stage("export_arrow_table", len(df)):
+                table = self.to_arrow_table(df, metadata)
         
-        # Export CSV
-        csv_path = os.path.join(output_dir, "synthetic-case-notes.csv")
-        export_df.to_csv(csv_path, index=False, encoding='utf-8')
-        print(f"✅ CSV exported: {csv_path}")
+        # CSV, JSON (or JSON Lines) and columnar writers, each returning its path;
+        # uncompressed CSV / JSON Lines writers also record their row offsets
+        writers = {"csv": partial(
+            self._write_csv, export_df, output_dir, compression=compression.get("csv"),
+            record_offsets=not compression.get("csv")
+        )}
+        if json_lines:
+            writers["jsonl"] = partial(
+                self._write_json_lines, export_df, output_dir, encoder=json_encoder, compression=compression.get("jsonl"),
+                record_offsets=not compression.get("jsonl")
+            )
+        else:
+            writers["json"] = partial(
+                self._write_json, export_df, metadata, output_dir, encoder=json_encoder, compression=compression.get("json")
+            )
+        default_codecs = {"parquet": "zstd", "feather": "uncompressed"}
+        for fmt in columnar:
+            writers[fmt] = partial(self._write_columnar, table, fmt, output_dir, compression.get(fmt, default_codecs[fmt]))
         
-        # Export JSON
-        json_data = {
-            "metadata": metadata,
-            "synthetic_cases": export_df.to_dict('records')
-        }
+        report = self._run_writers(writers, len(df), export_workers, export_executor)
+        offsets = {fmt: entry.pop("row_offsets") for fmt, entry in report.items() if "row_offsets" in entry}
+        for fmt, entry in report.items():
+            entry["compression"] = compression.get(fmt, default_codecs.get(fmt))
+        output_paths = {fmt: entry["path"] for fmt, entry in report.items()}
         
-        json_path = os.path.join(output_dir, "synthetic-case-notes.json")
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(json_data, f, ensure_ascii=False, indent=2)
-        print(f"✅ JSON exported: {json_path}")
+        # Label index over the uncompressed row-addressable outputs
+        with self._stage("export_index", len(df)):
+            indexed = {
+                fmt: path for fmt, path in output_paths.items()
+                if fmt in INDEXED_FORMATS and not (fmt in TEXT_FORMATS and compression.get(fmt))
+            }
+            output_paths["index"] = self._write_label_index(self._label_codes(df), output_dir, indexed, offsets)
         
-        # Export metadata YAML
-        yaml_path = os.path.join(output_dir, "dataset-metadata.yml")
-        with open(yaml_path, 'w', encoding='utf-8') as f:
-            yaml.dump(metadata, f, default_flow_style=False, allow_unicode=True)
-        print(f"✅ Metadata exported: {yaml_path}")
+        # Export metadata YAML, including the export stages and outputs above
+        metadata.update(self._profile_metadata())
+        metadata["export_report"] = report
+        output_paths["metadata"] = self._write_metadata(metadata, output_dir)
         
         # Export validation report
-        self._create_validation_report(df, metadata, output_dir)
+        self._create_validation_report(metadata, output_dir)
         
         # Export usage instructions
-        self._create_usage_instructions(output_dir)
+        self._create_usage_instructions(output_dir, list(indexed), compression)
+        
+        return output_paths
+
+    def _run_writers(self, writers: Dict[str, Callable[[], str]], rows: int, workers: int = 1,
+                     executor: str = "thread") -> Dict[str, Dict]:
+        """Run each output writer and report the path, bytes and seconds of every output.
+
+        With `workers > 1` the writers run concurrently and all read the same
+        in-memory frame. Threads share it directly, which pays off when
+        compression, file I/O and pyarrow (which release the GIL) dominate.
+        Forked processes ("process") inherit it copy-on-write, which also
+        spreads the CSV / JSON encoding over the CPUs; where fork is not
+        available they fall back to threads with a warning. The profiler records
+        the pool as one export_concurrent stage, since CPU time and memory
+        peaks cannot be split between overlapping outputs.
+        """
+        if executor not in EXPORT_EXECUTORS:
+            raise ValueError(f"Unsupported export executor: {executor!r} (choose from {', '.join(EXPORT_EXECUTORS)})")
+        if executor == "process" and not fork_available():
+            print("⚠️  Forked processes are not available on this platform; exporting on threads instead")
+            executor = "thread"
+        
+        if workers <= 1 or len(writers) <= 1:
+            report = {}
+            for fmt, writer in writers.items():
+                with self._stage(f"export_{fmt}", rows):
+                    report[fmt] = run_timed_writer(writer)
+            return report
+        
+        with self._stage("export_concurrent", rows):
+            if executor == "process":
+                return run_forked(writers, workers)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                futures = {fmt: pool.submit(run_timed_writer, writer) for fmt, writer in writers.items()}
+                return {fmt: future.result() for fmt, future in futures.items()}
+
+    def _write_csv(self, export_df: pd.DataFrame, output_dir: str, compression: str = None,
+                   record_offsets: bool = False) -> Union[str, Tuple[str, np.ndarray]]:
+        """Write the flattened frame as CSV (optionally gzip / zstd compressed) and return its path.
+
+        With `record_offsets` (uncompressed only) the row offsets for the
+        label index are recorded while writing and returned with the path.
+        """
+        csv_path = os.path.join(output_dir, "synthetic-case-notes.csv" + COMPRESSION_SUFFIXES.get(compression, ""))
+        if record_offsets and compression is None:
+            with open(csv_path, 'wb') as f:
+                writer = RowOffsetWriter(f)
+                export_df.to_csv(writer, index=False)
+                writer.flush()
+            print(f"✅ CSV exported: {csv_path}")
+            return csv_path, writer.row_offsets("csv", len(export_df))
+        with open_text_output(csv_path, compression) as f:
+            export_df.to_csv(f, index=False)
+        print(f"✅ CSV exported: {csv_path}")
+        return csv_path
+
+    def _write_json(self, export_df: pd.DataFrame, metadata: Dict, output_dir: str,
+                    encoder: str = "pandas", compression: str = None) -> str:
+        """Stream the flattened frame and metadata as one JSON document and return its path.
+
+        The document keeps the {"metadata", "synthetic_cases"} envelope with
+        the metadata pretty-printed, while the cases are written one compact
+        record per line, block by block.
+        """
+        envelope = json.dumps({"metadata": metadata, "synthetic_cases": []}, ensure_ascii=False, indent=2)
+        head, tail = envelope.rsplit("[]", 1)
+        
+        json_path = os.path.join(output_dir, "synthetic-case-notes.json" + COMPRESSION_SUFFIXES.get(compression, ""))
+        with open_text_output(json_path, compression) as f:
+            f.write(head + "[")
+            separator = "\n    "
+            for block in iter_json_lines(export_df, encoder=encoder):
+                # Raw newlines only occur between records (they are escaped inside strings)
+                f.write(separator + block.replace("\n", ",\n    "))
+                separator = ",\n    "
+            f.write(("\n  ]" if len(export_df) else "]") + tail)
+        print(f"✅ JSON exported: {json_path}")
+        return json_path
+
+    def _write_json_lines(self, export_df: pd.DataFrame, output_dir: str, encoder: str = "pandas",
+                          compression: str = None, record_offsets: bool = False) -> Union[str, Tuple[str, np.ndarray]]:
+        """Write the flattened frame as compact JSON Lines and return its path (and row offsets, see _write_csv)."""
+        json_path = os.path.join(output_dir, STREAM_FORMATS["jsonl"] + COMPRESSION_SUFFIXES.get(compression, ""))
+        recording = record_offsets and compression is None
+        with (open(json_path, 'wb') if recording else open_text_output(json_path, compression)) as f:
+            out = RowOffsetWriter(f) if recording else f
+            for block in iter_json_lines(export_df, encoder=encoder):
+                out.write(block + "\n")
+            out.flush()
+        print(f"✅ JSON Lines exported: {json_path}")
+        if recording:
+            return json_path, out.row_offsets("jsonl", len(export_df))
+        return json_path
+
+    def export_columnar(self, df: pd.DataFrame, metadata: Dict = None, output_dir: str = "./output",
+                        formats: Tuple[str, ...] = ("parquet", "feather"), row_group_size: int = DEFAULT_SHARD_SIZE,
+                        parquet_compression: str = "zstd", feather_compression: str = "uncompressed") -> Dict:
+        """Export data as Parquet and/or Arrow IPC (Feather v2) with dictionary-encoded categoricals.
+
+        Feather is left uncompressed by default so readers can memory-map it;
+        Parquet is written in row groups of `row_group_size` rows.
+        """
+        unknown = set(formats) - set(COLUMNAR_FORMATS)
+        if unknown:
+            raise ValueError(f"Unsupported columnar formats: {sorted(unknown)}")
+        
+        os.makedirs(output_dir, exist_ok=True)
+        table = self.to_arrow_table(df, metadata)
+        codecs = {"parquet": parquet_compression, "feather": feather_compression}
+        return {
+            fmt: self._write_columnar(table, fmt, output_dir, codecs[fmt], row_group_size)
+            for fmt in COLUMNAR_FORMATS if fmt in formats
+        }
+
+    def _write_columnar(self, table: "pa.Table", fmt: str, output_dir: str, compression: str,
+                        row_group_size: int = DEFAULT_SHARD_SIZE) -> str:
+        """Write an Arrow table as Parquet or Arrow IPC ("feather") and return its path."""
+        path = os.path.join(output_dir, COLUMNAR_FORMATS[fmt])
+        if fmt == "parquet":
+            pq.write_table(table, path, row_group_size=row_group_size, compression=compression)
+            print(f"✅ Parquet exported: {path}")
+        else:
+            feather.write_feather(table, path, compression=compression, chunksize=row_group_size)
+            print(f"✅ Arrow IPC exported: {path}")
+        return path
+
+    def to_arrow_table(self, df: pd.DataFrame, metadata: Dict = None) -> "pa.Table":
+        """Convert a client DataFrame to an Arrow table.
+
+        gender, location, archetype_id, writer_style and complexity_level are
+        dictionary-encoded against the generator's fixed categories, case_note
+        against note_variants (batch notes) or the distinct notes in the frame,
+        and embedded_scenarios becomes a uint8 bitmask. The bit order of that
+        mask and of the risk_factors mask is stored in the schema metadata.
+        """
+        if pa is None:
+            raise ImportError("pyarrow is required for Parquet / Arrow IPC export (pip install pyarrow)")
         
+        categories = self._export_categories()
+        arrays = []
+        for name in df.columns:
+            values = df[name]
+            if name in categories:
+                codes = pd.Categorical(values, categories=categories[name]).codes
+                if (codes < 0).any():
+                    raise ValueError(f"Unexpected {name} values: {sorted(set(values) - set(categories[name]))}")
+                arrays.append(pa.DictionaryArray.from_arrays(pa.array(codes, pa.int8()), pa.array(categories[name])))
+            elif name == "case_note" and isinstance(values.dtype, pd.CategoricalDtype):
+                # Batch notes already carry codes into the fixed note_variants table
+                arrays.append(pa.DictionaryArray.from_arrays(
+                    pa.array(values.cat.codes.to_numpy().astype(np.int32)),
+                    pa.array(values.cat.categories.to_numpy(dtype=object), pa.string())
+                ))
+            elif name == "case_note":
+                codes, uniques = pd.factorize(values)
+                arrays.append(pa.DictionaryArray.from_arrays(
+                    pa.array(codes.astype(np.int32)), pa.array(np.asarray(uniques, dtype=object), pa.string())
+                ))
+            elif name == "embedded_scenarios":
+                arrays.append(pa.array(self._scenario_bitmask(values), pa.uint8()))
+            else:
+                arrays.append(pa.array(values.to_numpy()))
+        
+        schema_metadata = {
+            "embedded_scenarios_bits": json.dumps(list(self.scenario_rates)),
+            "risk_factors_bits": json.dumps(list(self.risk_factors))
+        }
+        if metadata is not None:
+            schema_metadata["dataset_metadata"] = json.dumps(metadata, ensure_ascii=False, default=str)
+        return pa.Table.from_arrays(arrays, names=list(df.columns), metadata=schema_metadata)
+
+    def _export_categories(self) -> Dict[str, list]:
+        """Fixed category lists used to dictionary-encode categorical columns."""
+        locations = list(self.location_distribution)
+        locations += [a["location"] for a in self.archetypes.values() if a["location"] not in locations]
         return {
-            "csv": csv_path,
-            "json": json_path,
-            "metadata": yaml_path
+            "gender": list(self.gender_distribution),
+            "location": locations,
+            "complexity_level": list(self.complexity_distribution),
+            "archetype_id": list(self.archetypes),
+            "writer_style": list(self.writer_styles)
         }
 
-    def _create_validation_report(self, df: pd.DataFrame, metadata: Dict, output_dir: str):
+    def _label_dtypes(self) -> Dict[str, np.dtype]:
+        """dtype of each field's label codes: uint8 scenario bitmasks, category codes in code_dtype()."""
+        categories = self._export_categories()
+        dtypes = {"embedded_scenarios": np.dtype(np.uint8)}
+        dtypes.update({name: code_dtype(len(categories[name])) for name in LABEL_FIELDS[1:]})
+        return dtypes
+
+    def _label_codes(self, df: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """Per-row codes of the indexed labels: the scenario bitmask and category codes (see _export_categories)."""
+        scenarios = df["embedded_scenarios"]
+        if pd.api.types.is_integer_dtype(scenarios.dtype):
+            masks = scenarios.to_numpy().astype(np.uint8)
+        else:
+            masks = self._scenario_bitmask(scenarios)
+        categories = self._export_categories()
+        dtypes = self._label_dtypes()
+        codes = {"embedded_scenarios": masks}
+        for name in LABEL_FIELDS[1:]:
+            codes[name] = pd.Categorical(df[name], categories=categories[name]).codes.astype(dtypes[name], copy=False)
+        return codes
+
+    def _write_label_index(self, codes: Dict[str, np.ndarray], output_dir: str, paths: Dict[str, str],
+                           offsets: Dict[str, np.ndarray] = None) -> str:
+        """Build the label index from per-row codes, register the exported files it can read, and write it."""
+        index = LabelIndex.from_codes(codes, self._export_categories(), list(self.scenario_rates))
+        for fmt, path in paths.items():
+            index.add_file(fmt, path, (offsets or {}).get(fmt))
+        index_path = index.write(os.path.join(output_dir, INDEX_FILE))
+        print(f"✅ Label index exported: {index_path}")
+        return index_path
+
+    def _scenario_bitmask(self, scenario_lists: Iterable[List[str]]) -> np.ndarray:
+        """Encode per-client scenario lists as a uint8 bitmask (bit i = i-th key of scenario_rates)."""
+        return encode_scenarios(scenario_lists, list(self.scenario_rates))
+
+    def stream_dataset(self, target_count: int, output_dir: str = "./output",
+                       formats: Tuple[str, ...] = ("csv", "jsonl"), chunk_size: int = DEFAULT_SHARD_SIZE,
+                       workers: int = 1, json_encoder: str = "pandas", checkpoint_every: int = 0,
+                       append: bool = False, resume: bool = True) -> Dict:
+        """Generate the batch-mode dataset chunk by chunk straight into export_stream.
+
+        With `checkpoint_every > 0` progress is checkpointed in
+        <output_dir>/.checkpoint every that many chunks (CSV and JSON Lines
+        only). A rerun with the same parameters resumes after the last
+        checkpoint; a larger target_count, or `append=True` with target_count
+        as the number of clients to add, extends the files with continuing
+        person_oid numbering. A checkpoint written with other parameters
+        raises ValueError unless `resume=False`, which discards it.
+        """
+        if not checkpoint_every:
+            if append:
+                raise ValueError("append needs checkpointing (checkpoint_every > 0)")
+            chunks = self.iter_synthetic_chunks(target_count, chunk_size=chunk_size, workers=workers)
+            return self.export_stream(chunks, output_dir, formats=formats, json_encoder=json_encoder)
+        
+        checkpoint, target_count = self._open_checkpoint(
+            os.path.join(output_dir, CHECKPOINT_DIR), target_count, append, resume,
+            mode="stream", shard_size=chunk_size, formats=sorted(formats), json_encoder=json_encoder
+        )
+        chunks = self.iter_synthetic_chunks(
+            target_count, chunk_size=chunk_size, workers=workers,
+            start=checkpoint.state["rows"], first_shard=checkpoint.state["shards"]
+        )
+        return self.export_stream(
+            chunks, output_dir, formats=formats, json_encoder=json_encoder,
+            checkpoint=checkpoint, checkpoint_every=checkpoint_every
+        )
+
+    def export_stream(self, chunks: Iterable[pd.DataFrame], output_dir: str = "./output",
+                      formats: Tuple[str, ...] = ("csv", "jsonl"), json_encoder: str = "pandas",
+                      checkpoint: GenerationCheckpoint = None, checkpoint_every: int = 1) -> Dict:
+        """Append chunks to CSV, JSON Lines, Parquet and/or Arrow IPC files as they arrive.
+
+        Only the current chunk is held in memory, and each chunk is flushed
+        to disk before the next one is generated. Each chunk becomes one
+        Parquet row group / Arrow record batch; the Arrow IPC file relies on
+        batch notes sharing the fixed note_variants dictionary. Dataset
+        metrics are accumulated per chunk; label codes and CSV / JSON Lines
+        row offsets are spilled to disk per chunk (see LabelSpill, in the
+        checkpoint directory when there is one), and the label index,
+        metadata YAML, validation report and usage instructions are written
+        once the stream ends.
+
+        With a `checkpoint`, the file sizes and metrics are saved to it every
+        `checkpoint_every` chunks. If it already holds progress, the files
+        are cut back to the checkpointed sizes and `chunks` (which must start
+        after the checkpointed clients) are appended to them.
+        """
+        unknown = set(formats) - set(STREAM_FORMATS)
+        if unknown:
+            raise ValueError(f"Unsupported stream formats: {sorted(unknown)}")
+        if checkpoint is not None and {"parquet", "feather"} & set(formats):
+            raise ValueError("Checkpointed streams support csv and jsonl only; Parquet and Arrow IPC files cannot be resumed")
+        
+        os.makedirs(output_dir, exist_ok=True)
+        paths = {fmt: os.path.join(output_dir, STREAM_FORMATS[fmt]) for fmt in formats}
+        metrics = DatasetMetrics(list(self.scenario_rates), list(self.risk_factors))
+        sizes = {}
+        mode = 'wb'
+        if checkpoint is not None and checkpoint.state["metrics"]:
+            metrics = DatasetMetrics.from_dict(checkpoint.state["metrics"])
+            sizes = checkpoint.state["files"]
+            # Drop whatever was written after the last checkpoint
+            for fmt, size in sizes.items():
+                os.truncate(paths[fmt], size)
+            mode = 'ab'
+        
+        # Label codes and row offsets of the rows written so far, on disk
+        line_formats = [fmt for fmt in paths if fmt in ("csv", "jsonl")]
+        spill_dir = checkpoint.directory if checkpoint is not None else tempfile.mkdtemp(
+            prefix=".label-spill-", dir=output_dir
+        )
+        spill = LabelSpill(spill_dir, self._label_dtypes(), line_formats, rows=metrics.total, sizes=sizes)
+        files = {fmt: RowOffsetWriter(open(paths[fmt], mode), sizes.get(fmt, 0)) for fmt in line_formats}
+        parquet_writer = None
+        feather_writer = None
+        pending = 0
+        
+        def save_checkpoint(shard_count: int):
+            with self._stage("checkpoint"):
+                # Data must be on disk before the manifest points past it
+                for f in files.values():
+                    os.fsync(f.fileno())
+                spill.flush()
+                sizes = {fmt: os.fstat(f.fileno()).st_size for fmt, f in files.items()}
+                checkpoint.save(shard_count, metrics.total, metrics.to_dict(), files=sizes)
+        
+        try:
+            first_shard = checkpoint.state["shards"] if checkpoint is not None else 0
+            for shard_count, chunk in enumerate(chunks, first_shard + 1):
+                rows = len(chunk)
+                with self._stage("export_prepare", rows):
+                    export_chunk = self._prepare_export_frame(chunk)
+                if "csv" in files:
+                    with self._stage("export_csv", rows):
+                        export_chunk.to_csv(files["csv"], index=False, header=metrics.total == 0)
+                        files["csv"].flush()
+                if "jsonl" in files:
+                    with self._stage("export_jsonl", rows):
+                        for block in iter_json_lines(export_chunk, encoder=json_encoder):
+                            files["jsonl"].write(block + "\n")
+                        files["jsonl"].flush()
+                if "parquet" in paths or "feather" in paths:
+                    with self._stage("export_arrow_table", rows):
+                        table = self.to_arrow_table(chunk)
+                if "parquet" in paths:
+                    with self._stage("export_parquet", rows):
+                        if parquet_writer is None:
+                            parquet_writer = pq.ParquetWriter(paths["parquet"], table.schema, compression="zstd")
+                        parquet_writer.write_table(table)
+                if "feather" in paths:
+                    with self._stage("export_feather", rows):
+                        if feather_writer is None:
+                            feather_writer = pa.ipc.new_file(paths["feather"], table.schema)
+                        feather_writer.write_table(table)
+                # Chunks from iter_synthetic_chunks carry metrics computed by their worker
+                chunk_metrics = chunk.attrs.pop("metrics", None)
+                with self._stage("metrics" if chunk_metrics is None else "metrics_merge", rows):
+                    if chunk_metrics is None:
+                        metrics.update(chunk)
+                    else:
+                        metrics.merge(chunk_metrics)
+                with self._stage("export_index", rows):
+                    spill.append(self._label_codes(chunk), {fmt: f.pop_line_ends() for fmt, f in files.items()})
+                if checkpoint is not None:
+                    pending += 1
+                    if pending >= checkpoint_every:
+                        save_checkpoint(shard_count)
+                        pending = 0
+            if pending:
+                save_checkpoint(shard_count)
+        except BaseException:
+            spill.close(remove=checkpoint is None)
+            raise
+        finally:
+            for f in files.values():
+                f.close()
+            if parquet_writer is not None:
+                parquet_writer.close()
+            if feather_writer is not None:
+                feather_writer.close()
+        
+        for fmt, path in paths.items():
+            print(f"✅ {fmt.upper()} streamed: {path}")
+        
+        with self._stage("export_index", metrics.total):
+            try:
+                offsets = {fmt: spill.row_offsets(fmt) for fmt in line_formats}
+                paths["index"] = self._write_label_index(spill.codes(), output_dir, dict(paths), offsets)
+            finally:
+                spill.close(remove=checkpoint is None)
+        
+        metadata = self._build_metadata(metrics)
+        paths["metadata"] = self._write_metadata(metadata, output_dir)
+        self._create_validation_report(metadata, output_dir)
+        self._create_usage_instructions(output_dir, [fmt for fmt in paths if fmt in INDEXED_FORMATS])
+        
+        return {"rows": metrics.total, **paths}
+
+    def _write_metadata(self, metadata: Dict, output_dir: str) -> str:
+        """Write the dataset metadata YAML and return its path."""
+        yaml_path = os.path.join(output_dir, "dataset-metadata.yml")
+        with open(yaml_path, 'w', encoding='utf-8') as f:
+            yaml.dump(metadata, f, default_flow_style=False, allow_unicode=True)
+        print(f"✅ Metadata exported: {yaml_path}")
+        return yaml_path
+
+    def _prepare_export_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Return a view of the frame with embedded_scenarios and risk_factors flattened to comma-joined strings."""
+        scenarios = df["embedded_scenarios"]
+        if pd.api.types.is_integer_dtype(scenarios.dtype):
+            scenarios = self._bitmask_labels(list(self.scenario_rates))[scenarios.to_numpy()]
+        else:
+            scenarios = scenarios.map(",".join)
+        columns = {"embedded_scenarios": scenarios}
+        if "risk_factors" in df:
+            columns["risk_factors"] = self._bitmask_labels(list(self.risk_factors))[df["risk_factors"].to_numpy()]
+        return df.assign(**columns)
+
+    @staticmethod
+    def _bitmask_labels(names: List[str]) -> np.ndarray:
+        """Comma-joined names for every possible bitmask over `names` (bit i = names[i])."""
+        return np.array([
+            ",".join(name for bit, name in enumerate(names) if mask >> bit & 1)
+            for mask in range(1 << len(names))
+        ], dtype=object)
+
+    def _create_validation_report(self, metadata: Dict, output_dir: str):
         """Create validation report in Markdown format."""
         
         report = f"""# Synthetic Case Notes - Validation Report
@@ -383,7 +1791,7 @@ Generated: {metadata['export_timestamp']}
         target_dist = metadata['generation_parameters']['complexity_distribution']
         
         for level in sorted(complexity_dist.keys()):
-            count = len(df[df['complexity_level'] == level])
+            count = round(complexity_dist[level] * metadata['total_cases'])
             percentage = complexity_dist[level] * 100
             target = target_dist[f'level_{level}']
             report += f"| {level} | {count} | {percentage:.1f}% | {target} |\n"
@@ -391,10 +1799,11 @@ Generated: {metadata['export_timestamp']}
         report += f"""
 ## Validation Targets Achievement
 
-- **Housing Crisis Indicators**: {metadata['validation_targets']['housing_crisis_indicators']}
-- **Mental Health Deterioration**: {metadata['validation_targets']['mental_health_deterioration']}
-- **Successful Service Connections**: {metadata['validation_targets']['successful_service_connections']}
-
+"""
+        for scenario, summary in metadata['validation_targets'].items():
+            report += f"- **{scenario.replace('_', ' ').title()}**: {summary}\n"
+        
+        report += """
 ## Quality Metrics
 
 ### Gender Distribution
@@ -406,38 +1815,145 @@ Generated: {metadata['export_timestamp']}
         for location, percentage in metadata['quality_metrics']['location_distribution'].items():
             report += f"- {location}: {percentage*100:.1f}%\n"
         
-        report += """
-## Validation Status
+        report += "\n### Risk Factor Prevalence\n"
+        for factor, percentage in metadata['quality_metrics'].get('risk_factor_prevalence', {}).items():
+            report += f"- {factor}: {percentage*100:.1f}% (target {self.risk_factors[factor]*100:.0f}%)\n"
+        
+        diversity = metadata.get('note_diversity', {})
+        if diversity.get('notes'):
+            near = diversity['near_duplicates']
+            report += f"""
+## Note Diversity
 
-✅ **PASSED** - Dataset meets quality requirements and is ready for algorithm validation testing.
+- **Distinct Notes**: {diversity['distinct_notes']} of {diversity['notes']} ({diversity['distinct_note_ratio']*100:.2f}%)
+- **Most Common Note**: {diversity['most_common_note_share']*100:.1f}% of cases
+- **Note Entropy**: {diversity['note_entropy_bits']:.2f} bits
+- **Near-Duplicate Clusters**: {near['clusters']} clusters holding {near['notes_in_clusters']} distinct notes ({near['case_share_in_clusters']*100:.1f}% of cases); {near['effective_distinct_notes']} notes remain after merging near duplicates
+- **Largest Cluster**: {near['largest_cluster_share']*100:.1f}% of cases
+- **Method**: {near['method']}, estimated Jaccard similarity >= {near['similarity_threshold']}
 
+| N-gram | Distinct | Entropy (bits) |
+|--------|----------|----------------|
+"""
+            for order, bits in diversity['ngram_entropy_bits'].items():
+                report += f"| {order} | {diversity['distinct_ngrams'][order]} | {bits:.2f} |\n"
+        
+        varied_notes = repetitive_notes = False
+        if diversity.get('notes'):
+            near_duplicate_share = diversity['near_duplicates']['case_share_in_clusters']
+            repetitive_notes = (diversity['distinct_note_ratio'] < LOW_NOTE_DIVERSITY
+                                or near_duplicate_share > HIGH_NEAR_DUPLICATE_SHARE)
+            varied_notes = not repetitive_notes
+        
+        report += "\n## Validation Status\n\n"
+        if repetitive_notes:
+            report += (
+                f"⚠️ **PASSED WITH WARNINGS** - Dataset is usable for algorithm validation testing, but case notes repeat "
+                f"heavily ({diversity['distinct_note_ratio']*100:.2f}% distinct, {near_duplicate_share*100:.1f}% of "
+                f"cases in near-duplicate clusters); see the recommendations before evaluating text models.\n"
+            )
+        else:
+            report += "✅ **PASSED** - Dataset meets quality requirements and is ready for algorithm validation testing.\n"
+        
+        report += """
 ### Key Strengths
 - Realistic demographic distributions
 - Appropriate complexity level distribution
 - Embedded validation scenarios at target rates
-- Varied caseworker documentation styles
-- Complete fictional status maintained
+"""
+        if varied_notes:
+            report += "- Varied caseworker documentation styles\n"
+        report += """- Complete fictional status maintained
 
 ### Recommendations
 - Suitable for immediate use with sda-casenote-reader
 - Appropriate for algorithm validation testing
 - Can be scaled to larger datasets using same parameters
 """
+        if repetitive_notes:
+            report += (
+                f"- Notes repeat heavily ({diversity['distinct_notes']} distinct notes for {diversity['notes']} cases, "
+                f"{diversity['near_duplicates']['effective_distinct_notes']} after merging near duplicates): "
+                "deduplicate or split train/test by note before evaluating text models\n"
+            )
         
         report_path = os.path.join(output_dir, "validation-report.md")
         with open(report_path, 'w', encoding='utf-8') as f:
             f.write(report)
         print(f"✅ Validation report: {report_path}")
 
-    def _create_usage_instructions(self, output_dir: str):
-        """Create usage instructions in Markdown format."""
+    @staticmethod
+    def _label_index_usage(indexed_formats: List[str]) -> str:
+        """Usage-instructions section on the label index, with examples for a format this export indexed."""
+        if not indexed_formats:
+            return ("None of the exported files are covered by the label index (compressed `.gz` / `.zst`\n"
+                    "CSV and JSON Lines files and the JSON document are not indexed).\n\n")
+        fmt = "csv" if "csv" in indexed_formats else indexed_formats[0]
+        return f"""The label index reads only the matching rows from the export instead of
+scanning the whole file. In this export it covers: {", ".join(indexed_formats)}
+(compressed `.gz` / `.zst` files and the JSON document are not indexed).
+Filters accept one value or a list; different fields are combined with AND,
+and `embedded_scenarios="none"` selects the clients without any scenario:
+
+```python
+from label_index import load_rows
+
+housing_crisis_cases = load_rows(".", "{fmt}", embedded_scenarios="housing_crisis")
+rural_parents_in_crisis = load_rows(".", "{fmt}", complexity_level=[3, 4], archetype_id="rural_single_parent")
+baseline_cases = load_rows(".", "{fmt}", embedded_scenarios="none")
+```
+
+"""
+
+    @staticmethod
+    def _zstd_usage(compression: Dict[str, str]) -> str:
+        """Usage-instructions section on reading .zst files written without zstandard (pyarrow's codec)."""
+        zstd_formats = [fmt for fmt in TEXT_FORMATS if compression.get(fmt) == "zstd"]
+        if not zstd_formats or zstandard is not None:
+            return ""
+        reads = {
+            "csv": "df = pd.read_csv(f)",
+            "json": "data = json.load(f)",
+            "jsonl": "df = pd.read_json(f, lines=True)"
+        }
+        examples = "\n".join(
+            f'with pa.input_stream("synthetic-case-notes.{fmt}{COMPRESSION_SUFFIXES["zstd"]}", compression="zstd") as f:\n'
+            f'    {reads[fmt]}'
+            for fmt in zstd_formats
+        )
+        return f"""
+### Loading zstd-compressed Files
+The `.zst` files in this export were written with pyarrow's zstd codec because
+the `zstandard` package was not installed, and `pd.read_csv` cannot open them
+without it. Read them through pyarrow instead (or install `zstandard`):
+
+```python
+import json
+import pandas as pd
+import pyarrow as pa
+
+{examples}
+```
+"""
+
+    def _create_usage_instructions(self, output_dir: str, indexed_formats: List[str] = (),
+                                   compression: Dict[str, str] = None):
+        """Create usage instructions in Markdown format.
+
+        `indexed_formats` are the exports the label index covers and
+        `compression` the codec of each export, as given to export_data.
+        """
         
         instructions = """# Synthetic Case Notes - Usage Instructions
 
 ## File Structure
 
 - `synthetic-case-notes.csv` - Primary dataset in CSV format
-- `synthetic-case-notes.json` - Same data in JSON format with metadata
+- `synthetic-case-notes.json` - Same data in JSON format with metadata (one case per line)
+- `synthetic-case-notes.jsonl` - Alternative compact JSON Lines export without the metadata envelope
+- `synthetic-case-notes.parquet` / `synthetic-case-notes.arrow` - Optional columnar exports (Parquet and Arrow IPC)
+- `.gz` / `.zst` suffixes - CSV, JSON and JSON Lines files written with gzip or zstd compression (`--compress`); `pd.read_csv` and `read_csv` in R decompress `.gz` transparently, while `.zst` needs the `zstandard` package in pandas and `arrow::read_csv_arrow` in R
+- `synthetic-case-notes.index.npz` - Label index: row ids per scenario, complexity level, archetype and writer style, used by `label_index.load_rows`
 - `dataset-metadata.yml` - Generation parameters and quality metrics
 - `validation-report.md` - Quality assurance summary
 - `usage-instructions.md` - This file
@@ -446,7 +1962,7 @@ Generated: {metadata['export_timestamp']}
 
 | Field | Type | Description |
 |-------|------|-------------|
-| person_oid | String | Unique client identifier (CN-001 to CN-500) |
+| person_oid | String | Unique client identifier (CN-001, CN-002, ..., or fixed-width non-sequential ids under the permuted identity scheme) |
 | first_name | String | Fictional first name |
 | last_name | String | Fictional last name |
 | gender | String | Female/Male |
@@ -455,6 +1971,7 @@ Generated: {metadata['export_timestamp']}
 | complexity_level | Integer | 1=Stable, 2=Moderate, 3=High, 4=Crisis |
 | archetype_id | String | Client archetype identifier |
 | writer_style | String | Caseworker experience level |
+| risk_factors | String | Comma-separated risk factors (correlated draws) |
 | embedded_scenarios | String | Comma-separated validation scenarios |
 
 ## Integration with SDA Workflows
@@ -485,10 +2002,21 @@ with open("synthetic-case-notes.json", 'r') as f:
     data = json.load(f)
     df = pd.DataFrame(data['synthetic_cases'])
     metadata = data['metadata']
+
+# Load only the needed columns from the columnar exports
+df = pd.read_parquet("synthetic-case-notes.parquet", columns=["person_oid", "case_note"])
+import pyarrow as pa
+table = pa.ipc.open_file(pa.memory_map("synthetic-case-notes.arrow")).read_all()
 ```
+""" + self._zstd_usage(compression or {}) + """
+In the columnar exports, categorical columns are dictionary-encoded and
+`embedded_scenarios` and `risk_factors` are bitmasks; their bit orders are
+listed in the schema metadata (`embedded_scenarios_bits`, `risk_factors_bits`).
 
 ## Algorithm Validation Use Cases
 
+""" + self._label_index_usage(indexed_formats) + """In R, or without the index, filter the full dataset:
+
 ### Housing Crisis Detection
 ```r
 housing_crisis_cases <- case_notes %>%
@@ -532,27 +2060,149 @@ For questions about this dataset, refer to the validation report or contact the
         print(f"✅ Usage instructions: {instructions_path}")
 
 
-def main():
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    """Parse command-line options."""
+    parser = argparse.ArgumentParser(description="Generate synthetic case notes.")
+    parser.add_argument("--count", type=int, default=500, help="number of clients to generate")
+    parser.add_argument("--seed", type=int, default=42, help="master random seed")
+    parser.add_argument("--batch", action="store_true", help="use the columnar (sharded) generation path")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes for sharded generation")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE, help="clients per shard")
+    parser.add_argument("--stream", action="store_true",
+                        help="write shards to disk as they are generated instead of building one DataFrame")
+    parser.add_argument("--stream-formats", default="csv,jsonl", help="comma-separated formats for --stream")
+    parser.add_argument("--output-dir", default="./output", help="output directory")
+    parser.add_argument("--spec", default=DEFAULT_SPEC_PATH, help="YAML population spec")
+    parser.add_argument("--spec-cache-dir", help="cache directory for compiled specs (default: user cache directory)")
+    parser.add_argument("--no-spec-cache", action="store_true", help="always parse and compile the spec")
+    parser.add_argument("--columnar", default="",
+                        help="comma-separated columnar formats to add (parquet, feather); requires pyarrow")
+    parser.add_argument("--json-lines", action="store_true",
+                        help="write compact JSON Lines instead of the JSON document with its metadata envelope")
+    parser.add_argument("--json-encoder", default="pandas", choices=JSON_ENCODERS,
+                        help="encoder for JSON / JSON Lines output (orjson is fastest; requires orjson)")
+    parser.add_argument("--compress", default="",
+                        help="per-format compression, e.g. csv=gzip,json=zstd,parquet=zstd; "
+                             "a bare codec (gzip or zstd) applies to csv, json and jsonl")
+    parser.add_argument("--export-workers", type=int, default=1,
+                        help="threads or processes writing the export formats concurrently")
+    parser.add_argument("--export-executor", default="thread", choices=EXPORT_EXECUTORS,
+                        help="pool for --export-workers: threads, or forked processes that also parallelize encoding "
+                             "(threads where fork is unavailable)")
+    parser.add_argument("--profile", action="store_true",
+                        help="time each stage and record it as generation_profile in the metadata")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="with --profile, also record tracemalloc peaks (slows generation noticeably)")
+    parser.add_argument("--checkpoint-every", type=int, default=0,
+                        help="checkpoint progress every N shards (0 = off); a rerun resumes from the last checkpoint")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="discard an existing checkpoint (e.g. one written with another seed) and start over")
+    parser.add_argument("--checkpoint-dir",
+                        help="checkpoint directory for non-stream runs (default: <output-dir>/.checkpoint)")
+    parser.add_argument("--append", action="store_true",
+                        help="add --count clients to the checkpointed dataset, continuing person_oid numbering "
+                             "(checkpoints every shard unless --checkpoint-every is set)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="regenerate even when the output directory already holds outputs for these parameters")
+    return parser.parse_args(argv)
+
+
+def parse_compression(option: str) -> Dict[str, str]:
+    """Parse --compress ("csv=gzip,json=zstd" or a bare codec for every text format)."""
+    compression = {}
+    for item in filter(None, option.split(",")):
+        if "=" in item:
+            fmt, codec = item.split("=", 1)
+            compression[fmt] = codec
+        else:
+            compression.update(dict.fromkeys(TEXT_FORMATS, item))
+    return compression
+
+
+def print_profile(profiler: StageProfiler):
+    """Print the per-stage totals of a profiled run."""
+    print(f"\n⏱️  Stage Profile:")
+    print(f"  {'stage':<20} {'wall s':>9} {'cpu s':>9} {'rows/s':>14} {'peak MB':>9}")
+    for stage, total in profiler.summary().items():
+        rate = f"{total['rows_per_second']:,.0f}" if total["rows_per_second"] else ""
+        peak = f"{total['peak_bytes'] / 1e6:.1f}" if total["peak_bytes"] is not None else ""
+        print(f"  {stage:<20} {total['wall_seconds']:>9.3f} {total['cpu_seconds']:>9.3f} {rate:>14} {peak:>9}")
+
+
+def main(argv: List[str] = None):
     """Main execution function."""
+    args = parse_args(argv)
+    
     print("🚀 Starting Synthetic Case Note Generation")
     print("=" * 50)
     
     # Initialize generator
-    generator = SyntheticCaseNoteGenerator()
+    profiler = StageProfiler(track_memory=args.profile_memory) if args.profile else None
+    generator = SyntheticCaseNoteGenerator(
+        seed=args.seed, profiler=profiler, spec=args.spec,
+        spec_cache_dir=args.spec_cache_dir, use_spec_cache=not args.no_spec_cache
+    )
+    
+    # Reuse the outputs of an identical earlier run (profiling and appending always generate)
+    cache_key = generator.run_key(
+        count=args.count, batch=args.batch or args.workers > 1, shard_size=args.shard_size,
+        stream=args.stream and args.stream_formats, columnar=args.columnar,
+        json_lines=args.json_lines, json_encoder=args.json_encoder, compression=parse_compression(args.compress)
+    )
+    use_cache = not (args.no_cache or args.append or profiler)
+    cached = cached_outputs(args.output_dir, cache_key) if use_cache else None
+    if cached:
+        print(f"♻️  Outputs for these parameters are already in {args.output_dir}:")
+        for file_type, path in cached.items():
+            print(f"  - {file_type.upper()}: {path}")
+        return
+    
+    checkpoint_every = args.checkpoint_every or (1 if args.append else 0)
+    
+    if args.stream:
+        result = generator.stream_dataset(
+            args.count, args.output_dir, formats=tuple(args.stream_formats.split(",")), chunk_size=args.shard_size,
+            workers=args.workers, json_encoder=args.json_encoder, checkpoint_every=checkpoint_every,
+            append=args.append, resume=not args.no_resume
+        )
+        if not args.append:
+            record_outputs(args.output_dir, cache_key, {k: v for k, v in result.items() if k != "rows"})
+        print("\n" + "=" * 50)
+        print("✅ Generation Complete!")
+        print(f"📊 Streamed {result['rows']} synthetic case notes to {args.output_dir}")
+        if profiler:
+            print_profile(profiler)
+        return
     
     # Generate dataset
-    df, metadata = generator.generate_synthetic_dataset(target_count=500)
+    checkpoint_dir = None
+    if checkpoint_every:
+        checkpoint_dir = args.checkpoint_dir or os.path.join(args.output_dir, CHECKPOINT_DIR)
+    df, metadata = generator.generate_synthetic_dataset(
+        target_count=args.count, batch=args.batch, workers=args.workers, shard_size=args.shard_size,
+        checkpoint_dir=checkpoint_dir, checkpoint_every=checkpoint_every, append=args.append,
+        resume=not args.no_resume
+    )
     
     # Export data
-    output_paths = generator.export_data(df, metadata)
+    output_paths = generator.export_data(
+        df, metadata, args.output_dir, columnar=tuple(filter(None, args.columnar.split(","))),
+        json_lines=args.json_lines, json_encoder=args.json_encoder,
+        compression=parse_compression(args.compress), export_workers=args.export_workers,
+        export_executor=args.export_executor
+    )
+    if not args.append:
+        record_outputs(args.output_dir, cache_key, output_paths)
     
     print("\n" + "=" * 50)
     print("✅ Generation Complete!")
     print(f"📊 Generated {len(df)} synthetic case notes")
-    print(f"📁 Files saved in: ./output/")
+    print(f"📁 Files saved in: {args.output_dir}")
     print("\nFiles created:")
     for file_type, path in output_paths.items():
-        print(f"  - {file_type.upper()}: {path}")
+        entry = metadata["export_report"].get(file_type)
+        stats = f" ({entry['bytes'] / 1e6:.1f} MB in {entry['seconds']:.2f} s)" if entry else ""
+        print(f"  - {file_type.upper()}: {path}{stats}")
     
     # Display summary statistics
     print(f"\n📈 Summary Statistics:")
@@ -560,8 +2210,11 @@ def main():
     print(f"  - Gender split: {df['gender'].value_counts().to_dict()}")
     print(f"  - Complexity levels: {df['complexity_level'].value_counts().sort_index().to_dict()}")
     
-    scenarios_count = df['embedded_scenarios'].apply(len).sum()
+    scenarios_count = POPCOUNT_UINT8[generator._scenario_bitmask(df['embedded_scenarios'])].sum()
     print(f"  - Embedded scenarios: {scenarios_count} total")
+    
+    if profiler:
+        print_profile(profiler)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Synthetic Case Note Generator - Generation Checkpoints
+
+Records the progress of a sharded generation run on disk so that a run
+that stops part-way can resume from its last checkpoint, and so that a
+finished run can later be extended with more clients. Also keeps the
+output cache: a record of the files a run wrote, so a rerun with the same
+parameters can return them without generating anything.
+"""
+
+import glob
+import json
+import os
+import pickle
+import tempfile
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+# Default checkpoint directory inside an output directory, and its manifest
+CHECKPOINT_DIR = ".checkpoint"
+MANIFEST_FILE = "manifest.json"
+
+# Output cache record inside an output directory
+OUTPUT_CACHE_FILE = ".generation-cache.json"
+
+
+def write_json_atomic(path: str, data: Dict):
+    """Write JSON to a temporary file and move it into place, so readers never see a partial file."""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class GenerationCheckpoint:
+    """Progress of one sharded run: a JSON manifest plus, optionally, pickled client parts.
+
+    The manifest holds the run key, the number of shards and rows completed,
+    the serialized DatasetMetrics and any extra fields the writer needs
+    (such as output file sizes). A checkpoint is valid only for the run key
+    it was written under. The key covers the spec, code, seed and shard
+    size, but not the target count, so a larger target resumes or extends
+    the same run. The fields behind the key are saved with it, so loading
+    a checkpoint of a different run can say what changed.
+    """
+
+    def __init__(self, directory: str, run_key: str, key_fields: Dict = None):
+        self.directory = directory
+        self.run_key = run_key
+        self.key_fields = key_fields or {}
+        self.state = None
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.directory, MANIFEST_FILE)
+
+    def load(self) -> Optional[Dict]:
+        """Return the saved state, or None when there is none.
+
+        Raises ValueError naming the differing key fields when the directory
+        holds a checkpoint of another run; only reset() discards it.
+        """
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get("run_key") != self.run_key:
+            changes = mismatched_fields(state.get("key_fields", {}), self.key_fields)
+            raise ValueError(
+                f"Checkpoint in {self.directory} belongs to a different run "
+                f"({', '.join(changes) or 'written by an older version'}); "
+                f"rerun with the same parameters to resume, or discard it with --no-resume (resume=False)"
+            )
+        self.state = state
+        return state
+
+    def reset(self):
+        """Discard any previous checkpoint in the directory and start empty."""
+        os.makedirs(self.directory, exist_ok=True)
+        for path in glob.glob(os.path.join(self.directory, "part-*.pkl")) + [self.manifest_path]:
+            if os.path.exists(path):
+                os.remove(path)
+        self.state = {
+            "run_key": self.run_key, "key_fields": self.key_fields, "shards": 0, "rows": 0, "metrics": None, "parts": []
+        }
+
+    def write_part(self, frame: pd.DataFrame):
+        """Pickle a group of generated clients; it becomes part of the state on the next save()."""
+        name = f"part-{len(self.state['parts']):05d}.pkl"
+        with open(os.path.join(self.directory, name), 'wb') as f:
+            pickle.dump(frame, f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.state["parts"].append(name)
+
+    def read_parts(self) -> List[pd.DataFrame]:
+        """Load the client parts recorded in the state, in order."""
+        frames = []
+        for name in self.state["parts"]:
+            with open(os.path.join(self.directory, name), 'rb') as f:
+                frames.append(pickle.load(f))
+        return frames
+
+    def save(self, shards: int, rows: int, metrics: Dict, **extra):
+        """Record progress atomically; parts written since the last save become part of it."""
+        self.state.update(shards=shards, rows=rows, metrics=metrics, **extra)
+        write_json_atomic(self.manifest_path, self.state)
+
+
+def mismatched_fields(saved: Dict, current: Dict) -> List[str]:
+    """Describe the key fields that differ, e.g. "seed 42 -> 7" (digests are named without values)."""
+    changes = []
+    for field in sorted(set(saved) | set(current)):
+        old, new = saved.get(field), current.get(field)
+        if old == new:
+            continue
+        if isinstance(old, (dict, list)) or isinstance(new, (dict, list)) or field in ("spec", "code"):
+            changes.append(field)
+        else:
+            changes.append(f"{field} {old} -> {new}")
+    return changes
+
+
+def cached_outputs(output_dir: str, run_key: str) -> Optional[Dict[str, str]]:
+    """Output paths recorded for `run_key` in output_dir, if every file is still there unchanged."""
+    try:
+        with open(os.path.join(output_dir, OUTPUT_CACHE_FILE), 'r', encoding='utf-8') as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if record.get("run_key") != run_key:
+        return None
+
+    for entry in record["files"].values():
+        try:
+            stat = os.stat(entry["path"])
+        except OSError:
+            return None
+        if stat.st_size != entry["size"] or stat.st_mtime_ns != entry["mtime_ns"]:
+            return None
+    return {name: entry["path"] for name, entry in record["files"].items()}
+
+
+def record_outputs(output_dir: str, run_key: str, paths: Dict[str, str]):
+    """Record the files a run wrote (with sizes and modification times) under its run key."""
+    files = {}
+    for name, path in paths.items():
+        stat = os.stat(path)
+        files[name] = {"path": path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    write_json_atomic(os.path.join(output_dir, OUTPUT_CACHE_FILE), {"run_key": run_key, "files": files})
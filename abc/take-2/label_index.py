@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Synthetic Case Note Generator - Label Index
+
+A sidecar index written next to the exported dataset. It maps every
+embedded scenario, complexity level, archetype and writer style to the
+sorted row ids of the clients carrying it, and records where each row
+starts in the CSV and JSON Lines files (recorded while they are written,
+see RowOffsetWriter). load_rows() uses it to read only the matching rows,
+so a filtered subset loads in time proportional to the subset rather than
+to the whole dataset:
+
+    from label_index import load_rows
+    crisis = load_rows("output", "csv", embedded_scenarios="housing_crisis", complexity_level=[3, 4])
+"""
+
+import io
+import json
+import os
+import shutil
+from typing import BinaryIO, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# pyarrow is only needed to read rows from the Parquet / Arrow IPC exports
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+INDEX_FILE = "synthetic-case-notes.index.npz"
+INDEX_VERSION = 1
+
+# Indexed columns; embedded_scenarios is a bitmask, the others one category per row
+LABEL_FIELDS = ("embedded_scenarios", "complexity_level", "archetype_id", "writer_style")
+
+# embedded_scenarios filter value selecting clients without any scenario
+NO_SCENARIO = "none"
+
+# Exports load_rows() can read rows from
+INDEXED_FORMATS = ("csv", "jsonl", "parquet", "feather")
+
+# Header lines before the first row of each line-oriented format
+HEADER_LINES = {"csv": 1, "jsonl": 0}
+
+# Characters RowOffsetWriter buffers before encoding and scanning them in one go
+WRITE_BUFFER_CHARS = 1 << 20
+
+# Rows per block when building bitmaps from (possibly memory-mapped) label codes
+CODE_BLOCK_ROWS = 1 << 20
+
+
+def row_offsets(line_starts: np.ndarray, fmt: str, rows: int) -> Optional[np.ndarray]:
+    """Start offset of every row plus the end of the last one, or None when rows span several lines.
+
+    `line_starts` holds 0 followed by the offset just after every newline.
+    """
+    header = HEADER_LINES[fmt]
+    if len(line_starts) != rows + header + 1:
+        # A field with an embedded line break; rows cannot be located by line
+        return None
+    return line_starts[header:]
+
+
+class RowOffsetWriter:
+    """Text sink over a binary file that records the byte offset after every newline it writes.
+
+    Writes are buffered, then encoded to UTF-8 and scanned for newlines a
+    block at a time, so CSV and JSON Lines writers get their row offsets
+    without reading the file back. `position` is the file offset of the
+    first byte written (the file size when appending).
+    """
+
+    def __init__(self, f: BinaryIO, position: int = 0):
+        self.f = f
+        self.position = position
+        self.line_ends = []
+        self._buffer = []
+        self._buffered = 0
+
+    def write(self, text: str) -> int:
+        self._buffer.append(text)
+        self._buffered += len(text)
+        if self._buffered >= WRITE_BUFFER_CHARS:
+            self._drain()
+        return len(text)
+
+    def _drain(self):
+        if not self._buffer:
+            return
+        data = "".join(self._buffer).encode("utf-8")
+        self._buffer, self._buffered = [], 0
+        self.f.write(data)
+        newlines = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 10).astype(np.uint64)
+        self.line_ends.append(newlines + np.uint64(self.position + 1))
+        self.position += len(data)
+
+    def flush(self):
+        self._drain()
+        self.f.flush()
+
+    def fileno(self) -> int:
+        return self.f.fileno()
+
+    def close(self):
+        self.flush()
+        self.f.close()
+
+    def pop_line_ends(self) -> np.ndarray:
+        """Offsets after the newlines written since the last call."""
+        self._drain()
+        ends = np.concatenate(self.line_ends) if self.line_ends else np.zeros(0, dtype=np.uint64)
+        self.line_ends = []
+        return ends
+
+    def row_offsets(self, fmt: str, rows: int) -> Optional[np.ndarray]:
+        """Row offsets (see row_offsets) of a file written from its start."""
+        return row_offsets(np.concatenate([np.zeros(1, dtype=np.uint64), self.pop_line_ends()]), fmt, rows)
+
+
+class LabelSpill:
+    """Per-row label codes and line offsets of a streamed export, appended to raw files chunk by chunk.
+
+    Nothing per row stays in memory while the stream runs; the index is
+    built from memory-mapped views of the files at the end. Opening the
+    spill with the `rows` and data-file `sizes` of a checkpoint cuts the
+    files back to that point, like the exported files themselves.
+    """
+
+    def __init__(self, directory: str, dtypes: Dict[str, np.dtype], line_formats: Iterable[str],
+                 rows: int = 0, sizes: Dict[str, int] = None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.dtypes = {field: np.dtype(dtype) for field, dtype in dtypes.items()}
+        self.rows = rows
+        self.files = {}
+        for field, dtype in self.dtypes.items():
+            self.files[field] = self._open(f"labels-{field}.bin", rows * dtype.itemsize)
+        for fmt in line_formats:
+            name = f"lines-{fmt}.bin"
+            if rows:
+                starts = np.fromfile(os.path.join(directory, name), dtype=np.uint64)
+                kept = int(np.searchsorted(starts, np.uint64(sizes[fmt]), side="right"))
+                self.files[fmt] = self._open(name, kept * 8)
+            else:
+                self.files[fmt] = self._open(name, 0)
+                np.zeros(1, dtype=np.uint64).tofile(self.files[fmt])
+
+    def _open(self, name: str, size: int) -> BinaryIO:
+        path = os.path.join(self.directory, name)
+        f = open(path, 'r+b' if size else 'wb')
+        f.truncate(size)
+        f.seek(size)
+        return f
+
+    def append(self, codes: Dict[str, np.ndarray], line_ends: Dict[str, np.ndarray] = None):
+        """Append one chunk's label codes and the offsets after the lines it wrote."""
+        for field, dtype in self.dtypes.items():
+            np.asarray(codes[field], dtype=dtype).tofile(self.files[field])
+        self.rows += len(codes[LABEL_FIELDS[0]])
+        for fmt, ends in (line_ends or {}).items():
+            np.asarray(ends, dtype=np.uint64).tofile(self.files[fmt])
+
+    def flush(self):
+        """Push everything appended so far to disk (before a checkpoint records it)."""
+        for f in self.files.values():
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _map(self, name: str, dtype: np.dtype) -> np.ndarray:
+        self.files[name].flush()
+        if not self.files[name].tell():
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(self.files[name].name, dtype=dtype, mode='r')
+
+    def codes(self) -> Dict[str, np.ndarray]:
+        """Memory-mapped label codes of every row spilled so far."""
+        return {field: self._map(field, dtype) for field, dtype in self.dtypes.items()}
+
+    def row_offsets(self, fmt: str) -> Optional[np.ndarray]:
+        """Memory-mapped row offsets of a line-oriented file (see row_offsets)."""
+        return row_offsets(self._map(fmt, np.dtype(np.uint64)), fmt, self.rows)
+
+    def close(self, remove: bool = False):
+        for f in self.files.values():
+            f.close()
+        if remove:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class LabelIndex:
+    """Sorted row ids per label value, stored as a uint32/uint64 id list or a bitmap, whichever is smaller."""
+
+    def __init__(self, rows: int, labels: Dict[str, Dict[str, np.ndarray]], files: Dict[str, Dict] = None,
+                 offsets: Dict[str, np.ndarray] = None):
+        self.rows = rows
+        self.labels = labels
+        self.files = files or {}
+        self.offsets = offsets or {}
+
+    @classmethod
+    def from_codes(cls, codes: Dict[str, np.ndarray], categories: Dict[str, list],
+                   scenario_names: List[str]) -> "LabelIndex":
+        """Build the index from per-row label codes (see SyntheticCaseNoteGenerator._label_codes).
+
+        The codes may be memory-mapped (see LabelSpill): they are read in
+        blocks of CODE_BLOCK_ROWS into one bitmap per label value, so memory
+        stays at the size of the index itself.
+        """
+        rows = len(codes[LABEL_FIELDS[0]])
+        values = {"embedded_scenarios": list(scenario_names)}
+        values.update({field: list(categories[field]) for field in LABEL_FIELDS[1:]})
+        bitmaps = {field: np.zeros((len(field_values), (rows + 7) // 8), dtype=np.uint8)
+                   for field, field_values in values.items()}
+        for start in range(0, rows, CODE_BLOCK_ROWS):
+            for field, field_bitmaps in bitmaps.items():
+                block = np.asarray(codes[field][start:start + CODE_BLOCK_ROWS])
+                for code, bitmap in enumerate(field_bitmaps):
+                    hits = (block >> code & 1).astype(bool) if field == "embedded_scenarios" else block == code
+                    packed = np.packbits(hits)
+                    bitmap[start // 8:start // 8 + len(packed)] = packed
+        labels = {
+            field: {str(value): cls._compact(bitmap, rows) for value, bitmap in zip(values[field], bitmaps[field])}
+            for field in LABEL_FIELDS
+        }
+        return cls(rows, labels)
+
+    @staticmethod
+    def _compact(bitmap: np.ndarray, rows: int) -> np.ndarray:
+        """The bitmap (uint8, packbits) when denser than one row in 32, else the sorted id list."""
+        id_dtype = np.uint32 if rows < 1 << 32 else np.uint64
+        count = int(np.unpackbits(bitmap).sum(dtype=np.int64))
+        if count * np.dtype(id_dtype).itemsize > len(bitmap):
+            return bitmap
+        return np.flatnonzero(np.unpackbits(bitmap, count=rows)).astype(id_dtype)
+
+    def ids(self, field: str, value) -> np.ndarray:
+        """Sorted row ids with `value` in `field`; embedded_scenarios=NO_SCENARIO gives rows without any scenario."""
+        if field not in self.labels:
+            raise ValueError(f"Unknown index field: {field} (choose from {', '.join(self.labels)})")
+        if field == "embedded_scenarios" and value == NO_SCENARIO and NO_SCENARIO not in self.labels[field]:
+            return np.setdiff1d(np.arange(self.rows), self.row_ids(embedded_scenarios=list(self.labels[field])),
+                                assume_unique=True)
+        if str(value) not in self.labels[field]:
+            raise ValueError(f"Unknown {field} value: {value!r}")
+        stored = self.labels[field][str(value)]
+        if stored.dtype == np.uint8:
+            return np.flatnonzero(np.unpackbits(stored, count=self.rows))
+        return stored.astype(np.int64)
+
+    def row_ids(self, **filters) -> np.ndarray:
+        """Sorted row ids matching every filter; a filter is one value or a list of alternatives.
+
+        An empty list of alternatives matches no rows.
+        """
+        result = None
+        for field, values in filters.items():
+            if values is None:
+                continue
+            if isinstance(values, (str, int, np.integer)):
+                values = [values]
+            ids = [self.ids(field, value) for value in values]
+            matches = np.unique(np.concatenate(ids)) if ids else np.empty(0, dtype=np.int64)
+            result = matches if result is None else np.intersect1d(result, matches, assume_unique=True)
+        return np.arange(self.rows) if result is None else result
+
+    def add_file(self, fmt: str, path: str, offsets: np.ndarray = None):
+        """Record an exported file as readable through the index.
+
+        CSV / JSON Lines files need the row offsets recorded while they were
+        written (see RowOffsetWriter); without them they are listed but
+        cannot be read by row.
+        """
+        self.files[fmt] = {"file": os.path.basename(path), "size": os.path.getsize(path)}
+        if fmt in HEADER_LINES and offsets is not None:
+            self.offsets[fmt] = offsets
+
+    def write(self, path: str) -> str:
+        """Save as an uncompressed .npz with a JSON manifest, and return the path."""
+        arrays, labels = {}, {}
+        for field, values in self.labels.items():
+            labels[field] = {}
+            for value, stored in values.items():
+                key = f"label_{len(arrays)}"
+                arrays[key] = stored
+                labels[field][value] = {"key": key, "kind": "bitmap" if stored.dtype == np.uint8 else "ids"}
+        for fmt, offsets in self.offsets.items():
+            arrays[f"offsets_{fmt}"] = offsets
+        manifest = {"version": INDEX_VERSION, "rows": self.rows, "labels": labels, "files": self.files}
+        with open(path, 'wb') as f:
+            np.savez(f, manifest=np.array(json.dumps(manifest)), **arrays)
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "LabelIndex":
+        with np.load(path) as data:
+            manifest = json.loads(str(data["manifest"]))
+            if manifest["version"] != INDEX_VERSION:
+                raise ValueError(f"Unsupported label index version {manifest['version']} in {path}")
+            labels = {
+                field: {value: data[entry["key"]] for value, entry in values.items()}
+                for field, values in manifest["labels"].items()
+            }
+            offsets = {fmt: data[f"offsets_{fmt}"] for fmt in HEADER_LINES if f"offsets_{fmt}" in data}
+        return cls(manifest["rows"], labels, manifest["files"], offsets)
+
+
+def _byte_runs(ids: np.ndarray, offsets: np.ndarray) -> Iterable[tuple]:
+    """(start, end) byte ranges covering the rows, with consecutive rows merged into one read."""
+    if not len(ids):
+        return []
+    breaks = np.flatnonzero(np.diff(ids) != 1)
+    firsts = np.concatenate([[ids[0]], ids[breaks + 1]])
+    lasts = np.concatenate([ids[breaks], [ids[-1]]])
+    return zip(offsets[firsts].tolist(), offsets[lasts + 1].tolist())
+
+
+def read_rows(index: LabelIndex, output_dir: str, fmt: str, ids: np.ndarray) -> pd.DataFrame:
+    """Read the given rows (sorted ids) from one exported file."""
+    if fmt not in index.files:
+        raise ValueError(f"The index does not cover a {fmt} export (indexed: {', '.join(index.files) or 'none'})")
+    path = os.path.join(output_dir, index.files[fmt]["file"])
+    if os.path.getsize(path) != index.files[fmt]["size"]:
+        raise ValueError(f"{path} changed since the index was written; re-export to rebuild it")
+
+    if fmt in HEADER_LINES:
+        if fmt not in index.offsets:
+            raise ValueError(f"{path} has rows spanning several lines and cannot be read by row")
+        offsets = index.offsets[fmt]
+        with open(path, 'rb') as f:
+            header = f.read(int(offsets[0]))
+            chunks = [header]
+            for start, end in _byte_runs(ids, offsets):
+                f.seek(start)
+                chunks.append(f.read(end - start))
+        text = b"".join(chunks).decode("utf-8")
+        if fmt == "csv":
+            return pd.read_csv(io.StringIO(text), keep_default_na=False)
+        if not ids.size:
+            return pd.DataFrame()
+        return pd.read_json(io.StringIO(text), lines=True, dtype=False)
+
+    if pa is None:
+        raise ImportError("pyarrow is required to read rows from Parquet / Arrow IPC exports (pip install pyarrow)")
+    if fmt == "feather":
+        # Memory-mapped: only the pages holding the taken rows are read
+        table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+        return table.take(pa.array(ids, pa.int64())).to_pandas()
+
+    # Parquet: read only the row groups containing matches
+    parquet_file = pq.ParquetFile(path)
+    group_rows = np.array([parquet_file.metadata.row_group(i).num_rows for i in range(parquet_file.num_row_groups)])
+    group_starts = np.concatenate([[0], np.cumsum(group_rows)])
+    row_groups = np.searchsorted(group_starts, ids, side="right") - 1
+    groups = np.unique(row_groups)
+    if not len(groups):
+        return parquet_file.schema_arrow.empty_table().to_pandas()
+    table = parquet_file.read_row_groups(groups.tolist())
+    # Position of each row within the concatenation of the groups read
+    read_starts = np.concatenate([[0], np.cumsum(group_rows[groups])])[:-1]
+    local_ids = ids - group_starts[row_groups] + read_starts[np.searchsorted(groups, row_groups)]
+    return table.take(pa.array(local_ids, pa.int64())).to_pandas()
+
+
+def load_rows(output_dir: str, fmt: str = "csv", index_path: str = None, **filters) -> pd.DataFrame:
+    """Load the rows of an exported dataset that match the filters, using its label index.
+
+    Filters are keyword arguments over LABEL_FIELDS, each one value or a
+    list of alternatives, e.g. embedded_scenarios="housing_crisis",
+    complexity_level=[3, 4]; embedded_scenarios="none" selects the clients
+    without any scenario. Row ids are kept in df.attrs["row_ids"].
+    """
+    index = LabelIndex.load(index_path or os.path.join(output_dir, INDEX_FILE))
+    ids = index.row_ids(**filters)
+    rows = read_rows(index, output_dir, fmt, ids)
+    rows.attrs["row_ids"] = ids
+    return rows
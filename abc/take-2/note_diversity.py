@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Synthetic Case Note Generator - Note Diversity
+
+Measures how varied the generated case notes are: the share of distinct
+notes, the entropy of their word n-grams, and clusters of near-duplicate
+notes found with MinHash signatures and locality-sensitive hashing (LSH).
+
+NoteDiversity is a mergeable accumulator like DatasetMetrics: each chunk of
+notes is folded in once per distinct note it contains, accumulators built
+for different shards (possibly in worker processes) combine with merge(),
+and only one MinHash signature is kept per distinct note, so memory grows
+with the number of distinct notes rather than with the number of clients.
+"""
+
+import base64
+import hashlib
+import math
+import re
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+# Word n-gram orders whose entropy is reported
+NGRAM_ORDERS = (1, 2, 3)
+
+# MinHash over word shingles: NUM_PERM hash functions, split into LSH bands.
+# Notes sharing all rows of any band become candidates (likely above a
+# Jaccard similarity of about (1 / LSH_BANDS) ** (1 / rows per band) = 0.5)
+# and are clustered when their estimated similarity reaches the threshold.
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+LSH_BANDS = 16
+NEAR_DUPLICATE_THRESHOLD = 0.8
+MINHASH_SEED = 20251016
+
+# Universal hashing (a * x + b) mod p on 31-bit shingle hashes stays below 2**62
+MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+_PERMUTATIONS = np.random.default_rng(MINHASH_SEED).integers(1, (1 << 31) - 1, size=(2, NUM_PERM), dtype=np.uint64)
+
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+
+def note_key(note: str) -> int:
+    """Stable 64-bit key of a note's exact text."""
+    return int.from_bytes(hashlib.blake2b(note.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def tokenize(note: str) -> List[str]:
+    """Lower-cased words of a note, punctuation dropped."""
+    return WORD_PATTERN.findall(note.lower())
+
+
+def minhash_signature(words: List[str]) -> np.ndarray:
+    """MinHash signature (NUM_PERM uint32 values) of a note's word shingles."""
+    shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(max(1, len(words) - SHINGLE_SIZE + 1))}
+    hashes = np.array([zlib.crc32(shingle.encode("utf-8")) for shingle in shingles], dtype=np.uint64) % MERSENNE_PRIME
+    values = (_PERMUTATIONS[0][:, None] * hashes[None, :] + _PERMUTATIONS[1][:, None]) % MERSENNE_PRIME
+    return values.min(axis=1).astype(np.uint32)
+
+
+def entropy_bits(counts: Iterable[int]) -> float:
+    """Shannon entropy (bits) of a frequency distribution."""
+    counts = np.fromiter(counts, dtype=float)
+    total = counts.sum()
+    if total == 0:
+        return 0.0
+    return float(math.log2(total) - (counts * np.log2(counts)).sum() / total)
+
+
+def near_duplicate_clusters(signatures: np.ndarray, bands: int = LSH_BANDS,
+                            threshold: float = NEAR_DUPLICATE_THRESHOLD) -> np.ndarray:
+    """Cluster label per signature row: rows linked by LSH candidates with estimated Jaccard >= threshold.
+
+    Each band's rows are bucketed by their values; every member of a bucket
+    is compared with the bucket's first member (so the work stays linear in
+    the number of notes) and linked to it when similar enough. Linked rows
+    are merged with union-find; the label is the smallest row in the cluster.
+    """
+    count = len(signatures)
+    parent = np.arange(count)
+
+    def find(row: int) -> int:
+        while parent[row] != row:
+            parent[row] = parent[parent[row]]
+            row = parent[row]
+        return row
+
+    rows_per_band = signatures.shape[1] // bands
+    for band in range(bands):
+        band_values = np.ascontiguousarray(signatures[:, band * rows_per_band:(band + 1) * rows_per_band])
+        _, bucket, sizes = np.unique(
+            band_values.view(np.dtype((np.void, band_values.itemsize * rows_per_band))).ravel(),
+            return_inverse=True, return_counts=True
+        )
+        shared = np.flatnonzero(sizes[bucket] > 1)
+        if not len(shared):
+            continue
+        order = shared[np.argsort(bucket[shared], kind="stable")]
+        starts = np.flatnonzero(np.r_[True, bucket[order][1:] != bucket[order][:-1]])
+        firsts = np.repeat(order[starts], np.diff(np.r_[starts, len(order)]))
+        similar = (signatures[order] == signatures[firsts]).mean(axis=1) >= threshold
+        for first, member in zip(firsts[similar].tolist(), order[similar].tolist()):
+            root, other = find(first), find(member)
+            if root != other:
+                parent[max(root, other)] = min(root, other)
+    return np.array([find(row) for row in range(count)], dtype=np.int64)
+
+
+class NoteDiversity:
+    """Mergeable note counts, word n-gram counts and MinHash signatures behind the diversity metrics."""
+
+    def __init__(self):
+        self.total = 0
+        self.note_counts = Counter()
+        self.ngram_counts = {n: Counter() for n in NGRAM_ORDERS}
+        self.signatures = {}
+
+    def update(self, notes: pd.Series) -> "NoteDiversity":
+        """Fold one chunk of notes in; each distinct note in the chunk is tokenized once."""
+        value_counts = notes.value_counts()
+        # Categorical notes also report unused categories; skip those
+        value_counts = value_counts[value_counts > 0]
+        self.total += int(value_counts.sum())
+        for note, count in value_counts.items():
+            count = int(count)
+            key = note_key(note)
+            words = tokenize(note)
+            self.note_counts[key] += count
+            if key not in self.signatures:
+                self.signatures[key] = minhash_signature(words)
+            for n, ngrams in self.ngram_counts.items():
+                for i in range(len(words) - n + 1):
+                    ngrams[" ".join(words[i:i + n])] += count
+        return self
+
+    def merge(self, other: "NoteDiversity") -> "NoteDiversity":
+        """Add another accumulator's counts and signatures into this one."""
+        self.total += other.total
+        self.note_counts.update(other.note_counts)
+        for n, ngrams in self.ngram_counts.items():
+            ngrams.update(other.ngram_counts[n])
+        for key, signature in other.signatures.items():
+            self.signatures.setdefault(key, signature)
+        return self
+
+    def to_dict(self) -> Dict:
+        """JSON-serializable state; signatures are packed into one base64 string in note_counts order."""
+        keys = list(self.note_counts)
+        packed = np.stack([self.signatures[key] for key in keys]) if keys else np.zeros((0, NUM_PERM), np.uint32)
+        return {
+            "total": self.total,
+            "note_counts": [[key, count] for key, count in self.note_counts.items()],
+            "ngram_counts": {str(n): list(map(list, ngrams.items())) for n, ngrams in self.ngram_counts.items()},
+            "signatures": base64.b64encode(packed.astype("<u4").tobytes()).decode("ascii")
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "NoteDiversity":
+        """Rebuild an accumulator saved with to_dict()."""
+        diversity = cls()
+        diversity.total = data["total"]
+        diversity.note_counts = Counter(dict(map(tuple, data["note_counts"])))
+        for n in NGRAM_ORDERS:
+            diversity.ngram_counts[n] = Counter(dict(map(tuple, data["ngram_counts"].get(str(n), []))))
+        packed = np.frombuffer(base64.b64decode(data["signatures"]), dtype="<u4").reshape(-1, NUM_PERM)
+        diversity.signatures = dict(zip(diversity.note_counts, packed.astype(np.uint32)))
+        return diversity
+
+    def summary(self) -> Dict:
+        """Diversity metrics for the metadata and validation report."""
+        if not self.total:
+            return {"notes": 0}
+        keys = list(self.note_counts)
+        counts = np.array([self.note_counts[key] for key in keys], dtype=np.int64)
+        labels = near_duplicate_clusters(np.stack([self.signatures[key] for key in keys]))
+        _, cluster, cluster_notes = np.unique(labels, return_inverse=True, return_counts=True)
+        cluster_rows = np.bincount(cluster, weights=counts)
+        in_shared_cluster = cluster_notes[cluster] > 1
+        return {
+            "notes": self.total,
+            "distinct_notes": len(keys),
+            "distinct_note_ratio": len(keys) / self.total,
+            "most_common_note_share": float(counts.max() / self.total),
+            "note_entropy_bits": entropy_bits(counts),
+            "ngram_entropy_bits": {f"{n}-gram": entropy_bits(ngrams.values()) for n, ngrams in self.ngram_counts.items()},
+            "distinct_ngrams": {f"{n}-gram": len(ngrams) for n, ngrams in self.ngram_counts.items()},
+            "near_duplicates": {
+                "method": f"MinHash ({NUM_PERM} permutations, word {SHINGLE_SIZE}-shingles), LSH {LSH_BANDS} bands",
+                "similarity_threshold": NEAR_DUPLICATE_THRESHOLD,
+                "clusters": int((cluster_notes > 1).sum()),
+                "effective_distinct_notes": len(cluster_notes),
+                "notes_in_clusters": int(in_shared_cluster.sum()),
+                "case_share_in_clusters": float(counts[in_shared_cluster].sum() / self.total),
+                "largest_cluster_share": float(cluster_rows.max() / self.total)
+            }
+        }
@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""
+Synthetic Case Note Generator - Population Specification
+
+Loads the population parameters (distributions, risk factors, archetypes,
+scenarios, writer styles, note templates, names and identity scheme) from a
+YAML spec shaped like population-parameters-example.md; population-spec.yml
+holds the defaults. Name pools may be listed inline, read from text files
+(one name per line) referenced by the spec, or synthesized from lists of
+name parts. A spec may `extends` another one and replace some of its
+sections, as population-spec-large-names.yml does. The parameters and
+sampling tables the generator compiles from a spec are cached on disk under
+a hash of the spec and of the compiling code, so repeated runs and worker
+processes only read the YAML and skip building pools and tables.
+"""
+
+import hashlib
+import os
+import pickle
+import random
+import tempfile
+from collections import Counter
+from itertools import accumulate, product
+from typing import Callable, Dict, Iterable, Tuple
+
+import numpy as np
+import yaml
+
+from client_identity import MAX_OID_DIGITS, OID_SCHEMES
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_SPEC_PATH = os.path.join(SCRIPT_DIR, "population-spec.yml")
+
+REQUIRED_SECTIONS = (
+    "demographics", "complexity", "risk_factors", "archetypes",
+    "scenarios", "writer_styles", "note_templates", "names"
+)
+
+# Risk factors and scenarios are stored as uint8 bitmasks
+MAX_FLAGS = 8
+
+# Bump to invalidate every cached spec when the cache layout changes
+CACHE_FORMAT_VERSION = b"3"
+
+# How client complexity is assigned: exact quotas per (archetype, level)
+# stratum, or the original per-client draw from the archetype
+COMPLEXITY_ALLOCATIONS = ("quota", "draw")
+
+# Levels an archetype may be moved away from its own complexity under quota allocation
+ARCHETYPE_COMPLEXITY_SPREAD = 1
+
+# Default person_oid width per identity scheme (minimum width / fixed width and id space)
+DEFAULT_OID_DIGITS = {"sequential": 3, "permuted": 10}
+
+# Prefer libyaml's C loader when PyYAML was built with it
+SpecLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+class CategoricalTable:
+    """A weighted {category: weight} dict compiled once for repeated sampling.
+
+    `cdf` is the normalized cumulative distribution that Generator.choice(p=...)
+    rebuilds and validates on every call, so sample_codes() gives exactly the
+    same draws without that work. `cum_weights` does the same for
+    random.choices in the per-client path.
+    """
+
+    def __init__(self, distribution: Dict):
+        self.keys = list(distribution)
+        self.categories = np.array(self.keys, dtype=object if isinstance(self.keys[0], str) else None)
+        weights = np.array(list(distribution.values()), dtype=float)
+        self.cdf = (weights / weights.sum()).cumsum()
+        self.cdf /= self.cdf[-1]
+        self.cum_weights = list(accumulate(distribution.values()))
+
+    def sample_codes(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        """Draw `size` category codes (indices into keys)."""
+        return self.cdf.searchsorted(rng.random(size), side="right")
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        """Draw `size` categories."""
+        return self.categories[self.sample_codes(rng, size)]
+
+    def choice(self, random_state: random.Random):
+        """Draw one category with a `random.Random`."""
+        return random_state.choices(self.keys, cum_weights=self.cum_weights)[0]
+
+
+def apportion(total: int, weights: np.ndarray) -> np.ndarray:
+    """Split `total` into integer counts proportional to `weights` (largest remainder method).
+
+    Counts sum to exactly `total` and each is within one of its exact share;
+    ties for the leftover units go to the earlier weight.
+    """
+    weights = np.asarray(weights, dtype=float)
+    if total == 0 or weights.sum() <= 0:
+        return np.zeros(len(weights), dtype=np.int64)
+    shares = total * weights / weights.sum()
+    counts = np.floor(shares).astype(np.int64)
+    leftover = total - int(counts.sum())
+    counts[np.argsort(counts - shares, kind="stable")[:leftover]] += 1
+    return counts
+
+
+def fit_stratum_weights(row_targets: np.ndarray, column_targets: np.ndarray, seed: np.ndarray,
+                        home: np.ndarray = None, iterations: int = 5000, tolerance: float = 1e-9) -> np.ndarray:
+    """Scale `seed` (zero = forbidden cell) to the target row and column proportions.
+
+    Iterative proportional fitting. With `home` (each row's own column), every
+    sweep also levels any cell that has grown above its row's home cell down
+    to a shared value, so the home column stays each row's largest. Raises
+    ValueError when the margins cannot be met within `tolerance`.
+    """
+    weights = seed / seed.sum()
+    rows = np.arange(len(weights))
+    for _ in range(iterations):
+        weights *= (row_targets / weights.sum(axis=1))[:, None]
+        weights *= column_targets / weights.sum(axis=0)
+        if home is not None:
+            for row, column in zip(rows, home):
+                weights[row] = level_to_home(weights[row], column)
+        error = max(np.abs(weights.sum(axis=1) - row_targets).max(), np.abs(weights.sum(axis=0) - column_targets).max())
+        if error < tolerance:
+            return weights
+    raise ValueError(f"Stratum weights did not converge (margin error {error:.2g})")
+
+
+def level_to_home(row: np.ndarray, home: int) -> np.ndarray:
+    """`row` with its cells above row[home] averaged with it, keeping the row total."""
+    others = np.sort(np.delete(row, home))[::-1]
+    total, count = row[home], 1
+    for value in others:
+        if value <= total / count:
+            break
+        total, count = total + value, count + 1
+    level = total / count
+    if count == 1:
+        return row
+    row = row.copy()
+    row[row >= level] = level
+    row[home] = level
+    return row
+
+
+def archetype_complexity_weights(archetypes: Dict, complexity_distribution: Dict) -> np.ndarray:
+    """Fitted (archetype x complexity level) proportions for quota allocation.
+
+    Rows are archetypes in spec order (summing to their weight shares),
+    columns the complexity levels in ascending order (summing to
+    complexity_distribution). An archetype may take levels within
+    ARCHETYPE_COMPLEXITY_SPREAD of its own; its own level starts ten times as
+    likely as a neighbouring one (the 10% redraw of the "draw" allocation)
+    and always remains its most common. Raises ValueError when the
+    distribution cannot be met that way.
+    """
+    levels = np.array(sorted(complexity_distribution))
+    homes = np.array([archetype["complexity"] for archetype in archetypes.values()])
+    distance = np.abs(homes[:, None] - levels[None, :])
+    seed = np.where(distance == 0, 1.0, np.where(distance <= ARCHETYPE_COMPLEXITY_SPREAD, 0.1, 0.0))
+    targets = np.array([complexity_distribution[level] for level in levels], dtype=float)
+    shares = np.array([archetype.get("weight", 1.0) for archetype in archetypes.values()], dtype=float)
+    try:
+        return fit_stratum_weights(shares / shares.sum(), targets / targets.sum(), seed,
+                                   home=levels.searchsorted(homes))
+    except ValueError:
+        raise ValueError(
+            "complexity.distribution cannot be met under quota allocation while every archetype "
+            f"stays mostly at its own complexity within {ARCHETYPE_COMPLEXITY_SPREAD} level(s); "
+            "adjust the distribution, the archetypes' complexity or their weights"
+        ) from None
+
+
+def file_sha256(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def read_name_file(path: str) -> list:
+    """Names from a text file: one per line, blank lines and #-comments skipped, duplicates dropped."""
+    with open(path, 'r', encoding='utf-8') as f:
+        names = (line.strip() for line in f)
+        return list(dict.fromkeys(name for name in names if name and not name.startswith("#")))
+
+
+def synthesize_names(entry: Dict) -> list:
+    """A name pool mapping: its `names`, then every concatenation of one entry from each of its `parts` lists."""
+    unknown = set(entry) - {"names", "parts"}
+    if unknown:
+        raise ValueError(f"Unknown name pool keys: {sorted(unknown)} (use names and/or parts)")
+    parts = [list(part) for part in entry.get("parts", [])]
+    for part in parts:
+        if not part or not all(isinstance(piece, str) for piece in part):
+            raise ValueError(f"Name parts must be non-empty lists of strings (quote YAML words like 'y' and 'on'): {part}")
+    names = list(entry.get("names", []))
+    if parts:
+        names += ["".join(pieces) for pieces in product(*parts)]
+    return list(dict.fromkeys(names))
+
+
+def name_files_unchanged(parameters: Dict, base_dir: str) -> bool:
+    """Whether every name file a parsed spec read from still has the contents it was parsed from."""
+    for path, sha256 in parameters.get("name_files", {}).items():
+        try:
+            if file_sha256(os.path.join(base_dir, path)) != sha256:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def parse_population_spec(spec: Dict, base_dir: str = ".") -> Dict:
+    """Convert a parsed YAML spec into the generator's parameter attributes.
+
+    Age and archetype ranges become tuples, complexity levels ints and
+    correlation pairs tuple keys, matching the dicts the generator samples from.
+    A name pool given as a string is a file path (relative to `base_dir`);
+    the sha256 of every such file is kept in `name_files`. A mapping is
+    expanded with synthesize_names().
+    """
+    missing = [section for section in REQUIRED_SECTIONS if section not in spec]
+    if missing:
+        raise ValueError(f"Population spec is missing sections: {missing}")
+
+    demographics = spec["demographics"]
+    complexity = spec["complexity"]
+    risk = spec["risk_factors"]
+    identity = spec.get("identity", {})
+    oid_scheme = identity.get("oid_scheme", "sequential")
+    name_files = {}
+    name_parts = {}
+
+    def name_pool(entry, pool: str) -> list:
+        if isinstance(entry, str):
+            path = os.path.join(base_dir, entry)
+            name_files[entry] = file_sha256(path)
+            return read_name_file(path)
+        if isinstance(entry, dict):
+            name_parts[pool] = [list(part) for part in entry.get("parts", [])]
+            return synthesize_names(entry)
+        return list(dict.fromkeys(entry))
+
+    parameters = {
+        "age_distribution": {tuple(band["range"]): band["weight"] for band in demographics["age_distribution"]},
+        "gender_distribution": dict(demographics["gender_distribution"]),
+        "location_distribution": dict(demographics["location_distribution"]),
+        "complexity_distribution": {int(level): weight for level, weight in complexity["distribution"].items()},
+        "complexity_allocation": complexity.get("allocation", "quota"),
+        "risk_complexity_rules": dict(complexity["risk_adjustment"]),
+        "risk_factors": dict(risk["prevalence"]),
+        "risk_correlations": {tuple(pair["factors"]): pair["rho"] for pair in risk.get("correlations", [])},
+        "risk_keywords": {factor: list(words) for factor, words in risk.get("keywords", {}).items()},
+        "archetypes": {
+            name: {
+                "age_range": tuple(archetype["age_range"]),
+                "complexity": int(archetype["complexity"]),
+                "location": archetype["location"],
+                "weight": float(archetype.get("weight", 1))
+            }
+            for name, archetype in spec["archetypes"].items()
+        },
+        "scenario_rates": dict(spec["scenarios"]["rates"]),
+        "scenario_complexity": {
+            scenario: dict(bounds) for scenario, bounds in spec["scenarios"].get("preferred_complexity", {}).items()
+        },
+        "scenario_rules": {
+            scenario: [dict(rule) for rule in rules]
+            for scenario, rules in spec["scenarios"].get("rules", {}).items()
+        },
+        "writer_styles": dict(spec["writer_styles"]),
+        "note_templates": {
+            int(level): {style: list(templates) for style, templates in by_style.items()}
+            for level, by_style in spec["note_templates"].items()
+        },
+        "first_names": {
+            gender: name_pool(names, f"first_names.{gender}") for gender, names in spec["names"]["first_names"].items()
+        },
+        "last_names": name_pool(spec["names"]["last_names"], "last_names"),
+        "name_files": name_files,
+        "name_parts": name_parts,
+        "identity": {
+            "oid_scheme": oid_scheme,
+            "oid_prefix": str(identity.get("oid_prefix", "CN-")),
+            "oid_digits": int(identity.get("oid_digits", DEFAULT_OID_DIGITS.get(oid_scheme, 3))),
+            "oid_key": identity.get("oid_key")
+        }
+    }
+    validate_parameters(parameters)
+    return parameters
+
+
+def validate_parameters(parameters: Dict):
+    """Raise ValueError for a spec the generator cannot sample from."""
+    for name in ("gender_distribution", "location_distribution", "complexity_distribution",
+                 "writer_styles", "age_distribution"):
+        weights = list(parameters[name].values())
+        if not weights or min(weights) < 0 or sum(weights) <= 0:
+            raise ValueError(f"{name} needs non-negative weights with a positive total")
+
+    factors = parameters["risk_factors"]
+    if len(factors) > MAX_FLAGS or len(parameters["scenario_rates"]) > MAX_FLAGS:
+        raise ValueError(f"At most {MAX_FLAGS} risk factors and {MAX_FLAGS} scenarios are supported")
+    for (a, b), rho in parameters["risk_correlations"].items():
+        if a not in factors or b not in factors:
+            raise ValueError(f"Correlation between unknown risk factors: {a}, {b}")
+        if not -1 < rho < 1:
+            raise ValueError(f"Correlation {a}/{b} must be strictly between -1 and 1, got {rho}")
+
+    for scenario, rules in parameters["scenario_rules"].items():
+        if scenario not in parameters["scenario_rates"]:
+            raise ValueError(f"Rules for unknown scenario: {scenario}")
+        for rule in rules:
+            unknown = set(rule) - {"min_complexity", "max_complexity", "replace", "append"}
+            if unknown:
+                raise ValueError(f"Unknown keys in {scenario} rule: {sorted(unknown)}")
+            if any(not pattern for pattern in rule.get("replace", {})):
+                raise ValueError(f"Empty replace pattern in {scenario} rule")
+
+    levels = set(parameters["complexity_distribution"])
+    for scenario, bounds in parameters["scenario_complexity"].items():
+        if scenario not in parameters["scenario_rates"]:
+            raise ValueError(f"Preferred complexity for unknown scenario: {scenario}")
+        unknown = set(bounds) - {"min_complexity", "max_complexity"}
+        if unknown:
+            raise ValueError(f"Unknown keys in {scenario} preferred_complexity: {sorted(unknown)}")
+        if bounds.get("min_complexity", min(levels)) > bounds.get("max_complexity", max(levels)):
+            raise ValueError(f"{scenario} preferred_complexity has min_complexity above max_complexity")
+
+    for name, archetype in parameters["archetypes"].items():
+        if not archetype["weight"] > 0:
+            raise ValueError(f"Archetype {name} needs a positive weight")
+        if archetype["complexity"] not in levels:
+            raise ValueError(f"Archetype {name} has unknown complexity level {archetype['complexity']}")
+
+    if parameters["complexity_allocation"] not in COMPLEXITY_ALLOCATIONS:
+        raise ValueError(f"complexity.allocation must be one of {COMPLEXITY_ALLOCATIONS}")
+    if parameters["complexity_allocation"] == "quota":
+        homes = [archetype["complexity"] for archetype in parameters["archetypes"].values()]
+        for level, weight in parameters["complexity_distribution"].items():
+            if weight > 0 and all(abs(level - home) > ARCHETYPE_COMPLEXITY_SPREAD for home in homes):
+                raise ValueError(f"No archetype within {ARCHETYPE_COMPLEXITY_SPREAD} level(s) of complexity {level}")
+        archetype_complexity_weights(parameters["archetypes"], parameters["complexity_distribution"])
+
+    if set(parameters["note_templates"]) != levels:
+        raise ValueError("note_templates must have exactly one entry per complexity level")
+    for level, by_style in parameters["note_templates"].items():
+        for style in parameters["writer_styles"]:
+            if not by_style.get(style):
+                raise ValueError(f"No note templates for complexity level {level} / {style}")
+
+    for gender in parameters["gender_distribution"]:
+        if not parameters["first_names"].get(gender):
+            raise ValueError(f"No first names for gender {gender}")
+    if not parameters["last_names"]:
+        raise ValueError("names.last_names is empty")
+    for pool, parts in parameters.get("name_parts", {}).items():
+        for position, part in enumerate(parts):
+            duplicates = sorted(piece for piece, count in Counter(part).items() if count > 1)
+            if duplicates:
+                raise ValueError(f"names.{pool} parts list {position + 1} repeats {duplicates}, which skews the combinations")
+
+    identity = parameters["identity"]
+    if identity["oid_scheme"] not in OID_SCHEMES:
+        raise ValueError(f"identity.oid_scheme must be one of {OID_SCHEMES}")
+    if not 1 <= identity["oid_digits"] <= MAX_OID_DIGITS:
+        raise ValueError(f"identity.oid_digits must be between 1 and {MAX_OID_DIGITS}")
+    if identity["oid_key"] is not None and (not isinstance(identity["oid_key"], int) or identity["oid_key"] < 0):
+        raise ValueError("identity.oid_key must be a non-negative integer")
+    if not identity["oid_prefix"].isascii():
+        raise ValueError("identity.oid_prefix must be ASCII")
+
+
+def default_cache_dir() -> str:
+    """$CASE_NOTE_SPEC_CACHE, else case-note-simulator/specs under the user cache directory."""
+    if os.environ.get("CASE_NOTE_SPEC_CACHE"):
+        return os.environ["CASE_NOTE_SPEC_CACHE"]
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "case-note-simulator", "specs")
+
+
+def source_digest(code_files: Iterable[str] = ()) -> str:
+    """sha256 over this module and the given source files, to tie caches to the code that built them."""
+    digest = hashlib.sha256()
+    for path in (os.path.abspath(__file__), *code_files):
+        with open(path, 'rb') as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+def spec_cache_key(spec_bytes: bytes, code_files: Iterable[str] = ()) -> str:
+    """Hash of the spec contents and of the source files that compile it."""
+    digest = hashlib.sha256(CACHE_FORMAT_VERSION)
+    digest.update(source_digest(code_files).encode())
+    digest.update(spec_bytes)
+    return digest.hexdigest()
+
+
+def read_spec(path: str, extended_by: Tuple[str, ...] = ()) -> Tuple[Dict, bytes]:
+    """Parse a YAML spec and return it with the bytes it was read from.
+
+    A spec with `extends: <path>` (relative to it) starts from that spec,
+    and each of its own top-level sections replaces the base section of the
+    same name; the returned bytes then cover every file in the chain.
+    """
+    path = os.path.abspath(path)
+    if path in extended_by:
+        raise ValueError(f"Population spec extends itself: {path}")
+    with open(path, 'rb') as f:
+        spec_bytes = f.read()
+    spec = yaml.load(spec_bytes, Loader=SpecLoader) or {}
+    base = spec.pop("extends", None)
+    if base is None:
+        return spec, spec_bytes
+    base_spec, base_bytes = read_spec(os.path.join(os.path.dirname(path), base), (*extended_by, path))
+    return {**base_spec, **spec}, spec_bytes + b"\0" + base_bytes
+
+
+def load_compiled_spec(path: str, compile_tables: Callable[[Dict], Dict], cache_dir: str = None,
+                       use_cache: bool = True, code_files: Iterable[str] = ()) -> Tuple[Dict, Dict, str]:
+    """Return (parameters, compiled tables, spec sha256) for a YAML spec.
+
+    The YAML (with any `extends` chain, see read_spec) is always read, since
+    the cache key covers every file in the chain. On a cache miss the spec
+    is converted to parameters, `compile_tables(parameters)` builds
+    the sampling tables, and both are pickled under the cache key. The file
+    is written atomically, so concurrent runs never read a partial entry.
+    A cached entry whose name files have changed since is rebuilt.
+    """
+    spec, spec_bytes = read_spec(path)
+    spec_sha256 = hashlib.sha256(spec_bytes).hexdigest()
+    base_dir = os.path.dirname(os.path.abspath(path))
+
+    cache_path = None
+    if use_cache:
+        cache_dir = cache_dir or default_cache_dir()
+        cache_path = os.path.join(cache_dir, f"{spec_cache_key(spec_bytes, code_files)}.pickle")
+        try:
+            with open(cache_path, 'rb') as f:
+                parameters, tables = pickle.load(f)
+            if name_files_unchanged(parameters, base_dir):
+                return parameters, tables, spec_sha256
+        except (OSError, pickle.UnpicklingError, EOFError, ValueError, AttributeError):
+            pass
+
+    parameters = parse_population_spec(spec, base_dir)
+    tables = compile_tables(parameters)
+
+    if cache_path is not None:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((parameters, tables), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            # A read-only or full cache directory only costs the speed-up
+            pass
+
+    return parameters, tables, spec_sha256
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Synthetic Case Note Generator - Scenario Rewriting Engine
+
+Applies the scenario rules of a population spec (replacements and appended
+sentences per embedded scenario) to case notes in a single pass per note.
+"""
+
+import re
+from typing import Dict, List, Optional, Pattern, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class ScenarioRewriter:
+    """Rewrites case notes for their embedded scenarios with one compiled matcher.
+
+    Each scenario has a list of rules. A rule applies when its scenario is
+    embedded and the note's complexity is within the rule's optional
+    min_complexity / max_complexity. It contributes literal `replace`
+    substitutions and/or an `append` sentence. For every (complexity,
+    scenario bitmask) the substitutions of all applicable rules are compiled
+    into one regex alternation, longest pattern first. A note is then
+    scanned once, so text that was already substituted or appended is
+    never matched again. When two applicable rules replace the same
+    pattern, the rule of the earlier scenario wins.
+    """
+
+    def __init__(self, rules: Dict[str, List[Dict]], scenario_names: List[str]):
+        self.rules = rules
+        self.scenario_names = list(scenario_names)
+        self._compiled = {}
+
+    @staticmethod
+    def applies(rule: Dict, complexity: int) -> bool:
+        """Whether a rule's complexity bounds admit this complexity level."""
+        return rule.get("min_complexity", complexity) <= complexity <= rule.get("max_complexity", complexity)
+
+    def compile(self, complexity: int, scenario_mask: int) -> Tuple[Optional[Pattern], Dict[str, str], str]:
+        """Matcher, replacement table and appended suffix for one (complexity, scenario bitmask)."""
+        key = (int(complexity), int(scenario_mask))
+        if key not in self._compiled:
+            replacements, appendices = {}, []
+            for bit, scenario in enumerate(self.scenario_names):
+                if not key[1] >> bit & 1:
+                    continue
+                for rule in self.rules.get(scenario, ()):
+                    if not self.applies(rule, key[0]):
+                        continue
+                    for pattern, replacement in rule.get("replace", {}).items():
+                        replacements.setdefault(pattern, replacement)
+                    if rule.get("append"):
+                        appendices.append(rule["append"])
+
+            matcher = None
+            if replacements:
+                matcher = re.compile("|".join(re.escape(p) for p in sorted(replacements, key=len, reverse=True)))
+            self._compiled[key] = (matcher, replacements, "".join(" " + text for text in appendices))
+        return self._compiled[key]
+
+    def rewrite(self, note: str, complexity: int, scenario_mask: int) -> str:
+        """Apply every applicable rule to one note in a single scan."""
+        matcher, replacements, suffix = self.compile(complexity, scenario_mask)
+        if matcher is not None:
+            note = matcher.sub(lambda match: replacements[match.group()], note)
+        return note + suffix
+
+    def rewrite_column(self, notes, complexity, scenario_masks) -> np.ndarray:
+        """Rewrite a column of notes; each distinct (note, complexity, bitmask) row is rewritten once."""
+        note_codes, note_uniques = pd.factorize(np.asarray(notes, dtype=object))
+        complexity = np.asarray(complexity, dtype=np.int64)
+        scenario_masks = np.asarray(scenario_masks, dtype=np.int64)
+
+        # One integer key per row: note code, complexity level and 8-bit scenario mask
+        levels, level_codes = np.unique(complexity, return_inverse=True)
+        row_keys = (note_codes.astype(np.int64) * len(levels) + level_codes) * 256 + scenario_masks
+        keys, inverse = np.unique(row_keys, return_inverse=True)
+
+        rewritten = np.array([
+            self.rewrite(note_uniques[key // 256 // len(levels)], levels[key // 256 % len(levels)], key % 256)
+            for key in keys
+        ], dtype=object)
+        return rewritten[inverse]
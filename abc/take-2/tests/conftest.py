@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The generator modules are scripts in the parent directory, not a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
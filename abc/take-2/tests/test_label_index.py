@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from label_index import NO_SCENARIO, LabelIndex
+
+SCENARIOS = ["housing_crisis", "mental_health_deterioration"]
+CATEGORIES = {
+    "complexity_level": [1, 2, 3, 4],
+    "archetype_id": ["crisis_client", "stable_worker"],
+    "writer_style": ["experienced", "new"],
+}
+
+
+@pytest.fixture
+def index():
+    codes = {
+        "embedded_scenarios": np.array([0, 1, 2, 3, 0, 1], dtype=np.uint8),
+        "complexity_level": np.array([0, 1, 2, 3, 0, 1], dtype=np.uint8),
+        "archetype_id": np.array([0, 1, 0, 1, 0, 1], dtype=np.uint8),
+        "writer_style": np.array([0, 0, 1, 1, 0, 0], dtype=np.uint8),
+    }
+    return LabelIndex.from_codes(codes, CATEGORIES, SCENARIOS)
+
+
+def test_filters_combine_alternatives_and_fields(index):
+    assert index.row_ids(embedded_scenarios="housing_crisis").tolist() == [1, 3, 5]
+    assert index.row_ids(embedded_scenarios=SCENARIOS).tolist() == [1, 2, 3, 5]
+    assert index.row_ids(embedded_scenarios="housing_crisis", archetype_id="stable_worker").tolist() == [1, 3, 5]
+    assert index.row_ids(complexity_level=[1, 4], writer_style="new").tolist() == [3]
+
+
+def test_empty_alternatives_match_nothing(index):
+    assert index.row_ids(embedded_scenarios=[]).tolist() == []
+    assert index.row_ids(complexity_level=[], archetype_id="crisis_client").tolist() == []
+
+
+def test_no_scenario_selects_rows_without_scenarios(index):
+    assert index.row_ids(embedded_scenarios=NO_SCENARIO).tolist() == [0, 4]
+    assert index.row_ids(embedded_scenarios=[NO_SCENARIO, "mental_health_deterioration"]).tolist() == [0, 2, 3, 4]
+
+
+def test_unknown_value_is_rejected(index):
+    with pytest.raises(ValueError, match="Unknown archetype_id value"):
+        index.row_ids(archetype_id="none")
+
+
+def test_round_trip_keeps_row_ids(index, tmp_path):
+    loaded = LabelIndex.load(index.write(str(tmp_path / "index.npz")))
+    for field, values in index.labels.items():
+        for value in values:
+            assert loaded.ids(field, value).tolist() == index.ids(field, value).tolist()
+    assert loaded.row_ids(embedded_scenarios=NO_SCENARIO).tolist() == [0, 4]
@@ -0,0 +1,44 @@
+import copy
+
+import numpy as np
+import pytest
+import yaml
+
+from population_spec import DEFAULT_SPEC_PATH, archetype_complexity_weights, parse_population_spec
+
+
+@pytest.fixture
+def parameters():
+    with open(DEFAULT_SPEC_PATH) as f:
+        return parse_population_spec(yaml.safe_load(f))
+
+
+def test_quota_weights_meet_complexity_distribution(parameters):
+    weights = archetype_complexity_weights(parameters["archetypes"], parameters["complexity_distribution"])
+    targets = [parameters["complexity_distribution"][level] for level in sorted(parameters["complexity_distribution"])]
+    assert np.allclose(weights.sum(axis=0), targets)
+
+
+def test_each_archetype_keeps_its_own_complexity_modal(parameters):
+    weights = archetype_complexity_weights(parameters["archetypes"], parameters["complexity_distribution"])
+    levels = sorted(parameters["complexity_distribution"])
+    for row, (name, archetype) in zip(weights, parameters["archetypes"].items()):
+        home = levels.index(archetype["complexity"])
+        assert row[home] >= row.max() - 1e-9, f"{name} is mostly at complexity {levels[row.argmax()]}"
+
+
+def test_unreachable_distribution_fails_validation(parameters):
+    spec = copy.deepcopy(parameters)
+    spec["archetypes"]["crisis_client"]["weight"] = 1.0
+    with pytest.raises(ValueError, match="stays mostly at its own complexity"):
+        archetype_complexity_weights(spec["archetypes"], spec["complexity_distribution"])
+
+
+def test_generated_archetypes_are_mostly_at_their_own_complexity(tmp_path):
+    from generate_synthetic_data import SyntheticCaseNoteGenerator
+
+    generator = SyntheticCaseNoteGenerator(seed=7, spec_cache_dir=str(tmp_path))
+    clients = generator.generate_demographics_batch(20000)
+    modal = clients.groupby("archetype_id", observed=True)["complexity_level"].agg(lambda levels: levels.mode()[0])
+    for name, archetype in generator.archetypes.items():
+        assert modal[name] == archetype["complexity"]